@@ -1,24 +1,16 @@
 import json
-import pandas as pd
 import os
 
-from components.utils import auth_gspread, load_report
+from components.loading import load_dataset, get_version
+from components.shared import (SHARED_DATA_DIR, POLL_INTERVAL,
+                               published_version, map_dataset)
+from components.dataset import (Refresher, REFRESH_INTERVAL,
+                                get_dataset, set_dataset)
+from components.boot import stage
+from components.utils import period_start
 
 ### ----------------------------- SETUP ---------------------------------- ###
 
-client = auth_gspread()
-# load hours report
-
-print("loading hours report")
-hours_report = pd.concat([
-    load_report(client, 'hours-entries', '2024-table'),
-    load_report(client, 'hours-entries', '2023-table'),
-    load_report(client, 'hours-entries', '2022-table')
-    # load_report(client, 'hours-entries', '2021-table'),
-    # load_report(client, 'hours-entries', '2019-table')
-])  #TODO Exceeds memory of 550Mb
-hours_report['DT'] = pd.to_datetime(hours_report['DT'])
-    
 # load usernames
 try:
     with open('components/usernames.json') as f:
@@ -28,22 +20,34 @@ except:
     json_users = os.environ.get("VALID_USERNAMES")
     usernames = json.loads(json_users)
 
-print("loading hours entries")
-# load hours entries
-# hours_entries = load_report(client, 'hours-entries', '2023-hours')
-hours_entries = pd.concat([
-    load_report(client, 'hours-entries', '2024-hours'),
-    load_report(client, 'hours-entries', '2023-hours'),
-    load_report(client, 'hours-entries', '2022-hours')
-    # load_report(client, 'hours-entries', '2021-hours'),
-    # load_report(client, 'hours-entries', '2019-hours')
-])
-hours_entries['Hours Date'] = pd.to_datetime(hours_entries['Hours Date'])
-
-print("loading forecasts")
-# load forecasts
-forecasts = load_report(client, 'forecasts', 'forecasts')
-forecasts['Person, ODC, Travel'] = forecasts['Person, ODC, Travel'].str.replace(r'\s+[A-Z]$', '', regex=True)
-forecasts['period beginning'] = pd.to_datetime(forecasts['period beginning'])
-filt = forecasts['Project'].str.contains('B&P', case=False, na=False)
-forecasts.loc[filt, 'Project'] = 'B&P'
+
+def _swap_in(dataset):
+    # the utilization chart's predictions for the default view are built
+    # before serving, slider moves only rescale them
+    with stage('predictions'):
+        dataset.predictions(period_start)
+    set_dataset(dataset)
+    return dataset.version
+
+
+def reload_dataset():
+    """load and swap in a new dataset, returns its version"""
+    return _swap_in(load_dataset())
+
+
+def map_shared_dataset():
+    """map and swap in the dataset published by the gunicorn master"""
+    return _swap_in(map_dataset(SHARED_DATA_DIR))
+
+
+# under gunicorn with SHARED_DATA_DIR set the master publishes the data
+# (see gunicorn.conf.py) and workers map it, following new versions.
+# Otherwise load it here and poll for the Monday refresh
+if SHARED_DATA_DIR and published_version(SHARED_DATA_DIR):
+    refresher = Refresher(lambda: published_version(SHARED_DATA_DIR),
+                          map_shared_dataset, map_shared_dataset(),
+                          interval=POLL_INTERVAL)
+else:
+    refresher = Refresher(get_version, reload_dataset, reload_dataset())
+if REFRESH_INTERVAL:
+    refresher.start()
@@ -4,7 +4,7 @@ import dash_bootstrap_components as dbc
 from dash.dependencies import Input, Output, State
 from dash.exceptions import PreventUpdate
 
-from apps.data import forecasts
+from apps.data import get_dataset
 from components import visualizations
 from app import app
 
@@ -99,6 +99,6 @@ layout = html.Div([
 )
 def update_forecast_chart(name):        
     fig = visualizations.plot_projections(
-                forecasts, name
+                get_dataset().forecasts, name
                 )
     return fig
\ No newline at end of file
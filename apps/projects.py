@@ -2,19 +2,21 @@ import base64
 from dash import dcc
 from dash import html
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
 from dash import dash_table
+from dash import callback_context
 from datetime import datetime as dt
-from flask import send_file
+from flask import request, abort
 import pandas as pd
 import io
 import re  # used to regex date picker range output
-import urllib
 
-from components import visualizations
-from app import app
-from apps.data import usernames, hours_entries
+from components import visualizations, utils
+from components.table_query import PAGE_SIZE, query_table
+from components.csv_stream import download_url, stream_csv
+from app import app, server
+from apps.data import usernames, get_dataset
 
 ### ----------------------------- SETUP ---------------------------------- ###
 
@@ -40,7 +42,7 @@ instruction_text = [
 date_picker = dcc.DatePickerRange(
                 id='date-picker-range',
                 start_date=dt.today().strftime('%Y-%m-01'),
-                min_date_allowed='2022-04-01',  # TODO
+                min_date_allowed='2019-01-01',  # older years load on demand
                 end_date=dt.today().strftime('%Y-%m-%d'),
                 number_of_months_shown=2,
                 persistence=True,
@@ -106,9 +108,64 @@ download_link = dbc.Container(
 )
 
 ### TABLE ###
+table_columns = ['Classification', 'Project', 'Task Name', 'Hours Date', 
+                 'Entered Hours', 'Comments']
+column_types = {'Hours Date': 'datetime', 'Entered Hours': 'numeric'}
+
+# filtered, sorted and paged in update_entry_table, only the visible page
+# is sent to the browser
 entry_table = dbc.Container(
     dbc.Row(
-        dbc.Col(id='entry-table', width=12)
+        dbc.Col(
+            dash_table.DataTable(
+                id='entry-table',
+                columns = [{"name": i, "id": i, 
+                            "type": column_types.get(i, 'text')} 
+                           for i in table_columns],
+                data = [],
+                filter_action='custom',
+                filter_query='',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                page_action='custom',
+                page_current=0,
+                page_size=PAGE_SIZE,
+                style_cell={
+                    'whiteSpace': 'normal',
+                    'height': 'auto',
+                    'minWidth': '30px', 'width': '30px', 'maxWidth': '30px',
+                    'textAlign': 'center',
+                    'font-family': 'Calibri, Arial',
+                    'font-size': 14,
+                    'font-color': 'darkgrey'
+                },
+                style_header={
+                    'backgroundColor': 'white',
+                    'fontWeight': 'bold'
+                },
+                style_data_conditional=[
+                    {'if': {'row_index': 'odd'},
+                     'backgroundColor': 'rgb(248, 248, 248)'},
+                    # {'if': {'column_id': 'Task ID'},
+                    # 'width': '15%'},
+                    # {'if': {'column_id': 'Task Name'},
+                    # 'width': '25%'},
+                    # {'if': {'column_id': 'Hours Date'},
+                    # 'width': '15%'},
+                    # {'if': {'column_id': 'Entered Hours'},
+                    # 'width': '15%'},
+                    {'if': {'column_id': 'Comments'},
+                    'width': '60px','textAlign': 'left'}
+                ],
+                fixed_rows = {'headers': True},
+                style_table={'height': '500px', 
+                             'overflowY': 'auto',
+                             'overflowX': 'auto'},
+                style_as_list_view=True,
+            ),
+            width=12
+        )
     )
 )
 
@@ -125,6 +182,11 @@ The fire_me layout item triggers the update of the drop down to select
 a name
 '''
 
+### CHART FIGURES ###
+# top level and drill-down figures, the chart is rendered from them in the 
+# browser
+chart_figures = dcc.Store(id='projects-figures')
+
 ### LAYOUT ###
 layout = html.Div([
     data_store,
@@ -139,6 +201,7 @@ layout = html.Div([
     html.Br(),
     valid_thru,
     html.Br(),
+    chart_figures,
     fire_me
 ])
 
@@ -146,139 +209,160 @@ layout = html.Div([
 ### ---------------------------- CALLBACKS ------------------------------- ###
 
 ### UPDATE PROJECTS CHART ###
+def _get_click(clickData):
+    """returns the label of the clicked bar, or None"""
+    if clickData:
+        return clickData['points'][0]['y']
+    return None
+
+
 @app.callback(
-    Output('projects-chart', 'figure'),
+    Output('projects-figures', 'data'),
     [Input('select-name', 'value'),
      Input('date-picker-range', 'start_date'),
-     Input('date-picker-range', 'end_date'),
+     Input('date-picker-range', 'end_date')],
+    [State('projects-chart', 'clickData')]
+)
+def update_chart_figures(name, start_date, end_date, clickData):
+    # parse dates from calendar
+    start_date = dt.strptime(re.split('T| ', start_date)[0], '%Y-%m-%d')
+    end_date = dt.strptime(re.split('T| ', end_date)[0], '%Y-%m-%d')
+    # chart is answered from the daily rollup
+    dataset = get_dataset()
+    entries_by_date = dataset.query('cube_by_user', name, 
+                                    start_date, end_date)
+    
+    # the task totals of every project are sent along, so drilling down on
+    # a click happens in the browser (render_chart in assets/clientside.js)
+    labels = list(entries_by_date['Project'].unique())
+    # check all known labels, the click can outlive a date change
+    click = _get_click(clickData)
+    if click in dataset.dimensions['Project'] and click not in labels:
+        labels.append(click)
+    
+    meh = None
+    if not entries_by_date.empty:
+        meh = int(utils.get_meh_from_entries(entries_by_date))
+    top = visualizations.plot_projects(entries_by_date, mode='Projects',
+                                       meh=meh)
+    drilldown = visualizations.drilldown_totals(entries_by_date, 'Project',
+                                                labels)
+    return visualizations.drilldown_figures(top, drilldown, meh=meh,
+                                            empty=entries_by_date.empty)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='drilldown', function_name='render_chart'),
+    Output('projects-chart', 'figure'),
+    [Input('projects-figures', 'data'),
      Input('projects-chart', 'clickData')]
 )
-def update_project_chart(name, start_date, end_date, clickData):
+
+
+### UPDATE TABLE ###
+def _get_entries(name, start_date, end_date, click=None):
+    """returns the user's entries in the date range (and clicked project),
+    newest first"""
     # parse dates from calendar
     start_date = dt.strptime(re.split('T| ', start_date)[0], '%Y-%m-%d')
     end_date = dt.strptime(re.split('T| ', end_date)[0], '%Y-%m-%d')
     
-    if clickData is None:
-        mode = 'Projects'
-        project = None
-    else:
-        click = clickData['points'][0]['y']
-        if click in list(hours_entries['Project'].values):
-            mode = 'Tasks'
-            project = click
-        elif click in list(hours_entries['Task Name'].values):
+    # user's entries in the date range, oldest first
+    dataset = get_dataset()
+    dimensions = dataset.dimensions
+    entries_by_date = dataset.query('entries_by_user', name, 
+                                    start_date, end_date)
+    if click:
+        # check all known labels, the click can outlive a date change
+        if click in dimensions['Project']:
+            filt = entries_by_date['Project'] == click
+            entries_by_date = entries_by_date.loc[filt]
+        elif click in dimensions['Task Name']:
             raise PreventUpdate
-        
-    fig = visualizations.plot_projects(
-                hours_entries, name, start_date, end_date, mode=mode, 
-                project=project
-                )
-    return fig
+            # filt = entries_by_date['Task Name'] == click
+    
+    # newest first
+    return entries_by_date[table_columns].iloc[::-1]
+
+
+@app.callback(
+    Output('entry-table', 'data'),
+    Output('entry-table', 'page_count'),
+    Output('entry-table', 'page_current'),
+    [Input('select-name', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('projects-chart', 'clickData'),
+     Input('entry-table', 'page_current'),
+     Input('entry-table', 'sort_by'),
+     Input('entry-table', 'filter_query')]
+)
+def update_entry_table(name, start_date, end_date, clickData, 
+                       page_current, sort_by, filter_query):
+    if not name:
+        return [], 1, 0
+    
+    df = _get_entries(name, start_date, end_date, _get_click(clickData))
+    # back to the first page unless the page itself was changed
+    if callback_context.triggered[0]['prop_id'] != 'entry-table.page_current':
+        page_current = 0
+    page, page_count, page_current = query_table(df, filter_query, sort_by, 
+                                                 page_current)
+    page = page.copy()
+    page['Hours Date'] = page['Hours Date'].dt.date
+    
+    return page.to_dict('records'), page_count, page_current
 
 
-### UPDATE TABLE ###
 @app.callback(
-    Output('entry-table', 'children'),
     Output('download-link', 'href'),
     [Input('select-name', 'value'),
      Input('date-picker-range', 'start_date'),
      Input('date-picker-range', 'end_date'),
      Input('projects-chart', 'clickData')]
 )
-def update_entry_table(name, start_date, end_date, clickData):
-    # parse dates from calendar
-    start_date = dt.strptime(re.split('T| ', start_date)[0], '%Y-%m-%d')
-    end_date = dt.strptime(re.split('T| ', end_date)[0], '%Y-%m-%d')
+def update_download_link(name, start_date, end_date, clickData):
+    if not name:
+        raise PreventUpdate
     
-    if name:
-        filt = ((hours_entries['User Name'] == name) 
-                & (hours_entries['Hours Date'] >= start_date)
-                & (hours_entries['Hours Date'] <= end_date))
-        if clickData:
-            click = clickData['points'][0]['y']
-            if click in list(hours_entries['Project'].values):
-                filt = ((hours_entries['User Name'] == name) 
-                    & (hours_entries['Hours Date'] >= start_date)
-                    & (hours_entries['Hours Date'] <= end_date)
-                    & (hours_entries['Project'] == click))
-            elif click in list(hours_entries['Task Name'].values):
-                raise PreventUpdate
-                # filt = ((hours_entries['User Name'] == name) 
-                #     & (hours_entries['Hours Date'] >= start_date)
-                #     & (hours_entries['Hours Date'] <= end_date)
-                #     & (hours_entries['Task Name'] == click))               
-                
-        columns = ['Classification', 'Project', 'Task Name', 'Hours Date', 
-                   'Entered Hours', 'Comments']
-        df = hours_entries.loc[filt, columns]
-        df.sort_values('Hours Date', ascending=False, inplace=True)
-        df['Hours Date'] = df['Hours Date'].dt.date
-        
-        table = dash_table.DataTable(
-            columns = [{"name": i, "id": i} for i in df.columns],
-            data = df.to_dict('records'),
-            filter_action='native',
-            sort_action='native',
-            sort_mode='multi',
-            style_cell={
-                'whiteSpace': 'normal',
-                'height': 'auto',
-                'minWidth': '30px', 'width': '30px', 'maxWidth': '30px',
-                'textAlign': 'center',
-                'font-family': 'Calibri, Arial',
-                'font-size': 14,
-                'font-color': 'darkgrey'
-            },
-            style_header={
-                'backgroundColor': 'white',
-                'fontWeight': 'bold'
-            },
-            style_data_conditional=[
-                {'if': {'row_index': 'odd'},
-                 'backgroundColor': 'rgb(248, 248, 248)'},
-                # {'if': {'column_id': 'Task ID'},
-                # 'width': '15%'},
-                # {'if': {'column_id': 'Task Name'},
-                # 'width': '25%'},
-                # {'if': {'column_id': 'Hours Date'},
-                # 'width': '15%'},
-                # {'if': {'column_id': 'Entered Hours'},
-                # 'width': '15%'},
-                {'if': {'column_id': 'Comments'},
-                'width': '60px','textAlign': 'left'}
-            ],
-            page_action = 'none',  # implement back-end sorting if paging
-            fixed_rows = {'headers': True},
-            style_table={'height': '500px', 
-                         'overflowY': 'auto',
-                         'overflowX': 'auto'},
-            style_as_list_view=True,
-        )
-        
-        # Convert DataFrame to JSON
-        csv_string = df.to_csv(index=False, encoding='utf-8')
-        csv_string = "data:text/csv;charset=utf-8,%EF%BB%BF" + urllib.parse.quote(csv_string)
-        # df_json = df.to_json(date_format='iso', orient='split')
-        return table, csv_string
+    click = _get_click(clickData)
+    # raises PreventUpdate on a task click, keeping the project's link
+    _get_entries(name, start_date, end_date, click)
+    
+    # the csv is built when the link is clicked
+    return download_url('/download/my-entries.csv', name=name, 
+                        start_date=start_date, end_date=end_date, click=click)
+
+
+@server.route('/download/my-entries.csv')
+def download_my_entries():
+    args = request.args
+    try:
+        df = _get_entries(args['name'], args['start_date'], args['end_date'], 
+                          args.get('click'))
+    except (KeyError, ValueError, PreventUpdate):
+        abort(400)
+    df = df.copy()
+    df['Hours Date'] = df['Hours Date'].dt.date
+    
+    return stream_csv(df, 'entries.csv')
 
 # enable reset button
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='drilldown', function_name='enable_reset'),
     Output('clear-clickData', 'disabled'),
     [Input('projects-chart', 'clickData')]
 )
-def enable_reset(clickData):
-    return clickData is None
 
 
 # reset projects chart
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='drilldown', function_name='clear_click'),
     Output('projects-chart', 'clickData'),
     [Input('clear-clickData', 'n_clicks'),
-     Input('select-name', 'value')]
+     Input('select-name', 'value')],
+    [State('projects-chart', 'clickData')]
 )
-def clear_clickData(n_clicks, name):
-    if n_clicks or name:
-        return None
     
 # # download entries
 # @app.callback(
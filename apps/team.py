@@ -1,21 +1,23 @@
 from dash import dcc
 from dash import html
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
 from dash import dash_table
+from dash import callback_context
 from datetime import datetime as dt
+from flask import request, abort
 import re  # used to regex date picker range output
-import urllib
 
 from components import visualizations
-from app import app
-from apps.data import usernames, hours_entries
+from components.table_query import PAGE_SIZE, query_table
+from components.csv_stream import download_url, stream_csv
+from components.dimensions import TEAM_PROJECT
+from app import app, server
+from apps.data import usernames, get_dataset
 
 ### ----------------------------- SETUP ---------------------------------- ###
-task_entries = hours_entries.copy()
-filt = task_entries['Project'].isin(['Overhead', 'R&D', 'G&A'])
-task_entries.loc[filt, 'Project'] = task_entries.loc[filt, 'Task Name']
+
 
 ### ----------------------------- LAYOUT --------------------------------- ###
 
@@ -34,7 +36,7 @@ instruction_text = [
 date_picker = dcc.DatePickerRange(
                 id='date-picker-range',
                 start_date=dt.today().strftime('%Y-%m-01'),
-                min_date_allowed='2022-04-01',  # TODO
+                min_date_allowed='2019-01-01',  # older years load on demand
                 end_date=dt.today().strftime('%Y-%m-%d'),
                 number_of_months_shown=2,
                 persistence=True,
@@ -100,9 +102,64 @@ download_link = dbc.Container(
 )
 
 ### TABLE ###
+table_columns = ['Classification', 'User Name', 'Task Name', 'Hours Date', 
+                 'Entered Hours', 'Comments']
+column_types = {'Hours Date': 'datetime', 'Entered Hours': 'numeric'}
+
+# filtered, sorted and paged in update_entry_table, only the visible page
+# is sent to the browser
 entry_table = dbc.Container(
     dbc.Row(
-        dbc.Col(id='entry-table-team', width=12)
+        dbc.Col(
+            dash_table.DataTable(
+                id='entry-table-team',
+                columns = [{"name": i, "id": i, 
+                            "type": column_types.get(i, 'text')} 
+                           for i in table_columns],
+                data = [],
+                filter_action='custom',
+                filter_query='',
+                sort_action='custom',
+                sort_mode='multi',
+                sort_by=[],
+                page_action='custom',
+                page_current=0,
+                page_size=PAGE_SIZE,
+                style_cell={
+                    'whiteSpace': 'normal',
+                    'height': 'auto',
+                    'minWidth': '30px', 'width': '30px', 'maxWidth': '30px',
+                    'textAlign': 'center',
+                    'font-family': 'Calibri, Arial',
+                    'font-size': 14,
+                    'font-color': 'darkgrey'
+                },
+                style_header={
+                    'backgroundColor': 'white',
+                    'fontWeight': 'bold'
+                },
+                style_data_conditional=[
+                    {'if': {'row_index': 'odd'},
+                     'backgroundColor': 'rgb(248, 248, 248)'},
+                    # {'if': {'column_id': 'Task ID'},
+                    # 'width': '15%'},
+                    # {'if': {'column_id': 'Task Name'},
+                    # 'width': '25%'},
+                    # {'if': {'column_id': 'Hours Date'},
+                    # 'width': '15%'},
+                    # {'if': {'column_id': 'Entered Hours'},
+                    # 'width': '15%'},
+                    {'if': {'column_id': 'Comments'},
+                    'width': '60px','textAlign': 'left'}
+                ],
+                fixed_rows = {'headers': True},
+                style_table={'height': '500px', 
+                             'overflowY': 'auto',
+                             'overflowX': 'auto'},
+                style_as_list_view=True,
+            ),
+            width=12
+        )
     )
 )
 
@@ -119,6 +176,11 @@ The fire_me layout item triggers the update of the drop down to select
 a name
 '''
 
+### CHART FIGURES ###
+# top level and drill-down figures, the chart is rendered from them in the 
+# browser
+chart_figures = dcc.Store(id='team-figures')
+
 ### LAYOUT ###
 layout = html.Div([
     dbc.Container(instruction_text),
@@ -132,6 +194,7 @@ layout = html.Div([
     html.Br(),
     valid_thru,
     html.Br(),
+    chart_figures,
     fire_me
 ])
 
@@ -144,149 +207,168 @@ layout = html.Div([
     [Input('fire', 'children')]
 )
 def populate_names(_):
-    # get list of unique projects
-    projects = task_entries['Project'].dropna().unique()
-    projects.sort()
+    # projects of every year, not only the loaded ones
+    projects = sorted(get_dataset().dimensions[TEAM_PROJECT].labels)
     options = [{'label': project, 'value': project} for project in projects]
         
     return [options]
 
 
 ### UPDATE PROJECTS CHART ###
+def _get_click(clickData):
+    """returns the label of the clicked bar, or None"""
+    if clickData:
+        return clickData['points'][0]['y']
+    return None
+
+
 @app.callback(
-    Output('team-chart', 'figure'),
+    Output('team-figures', 'data'),
     [Input('select-project', 'value'),
      Input('date-picker-range', 'start_date'),
-     Input('date-picker-range', 'end_date'),
+     Input('date-picker-range', 'end_date')],
+    [State('team-chart', 'clickData')]
+)
+def update_chart_figures(name, start_date, end_date, clickData):
+    # parse dates from calendar
+    start_date = dt.strptime(re.split('T| ', start_date)[0], '%Y-%m-%d')
+    end_date = dt.strptime(re.split('T| ', end_date)[0], '%Y-%m-%d')
+    # chart is answered from the daily rollup
+    dataset = get_dataset()
+    entries_by_date = dataset.query('cube_by_project', name, 
+                                    start_date, end_date)
+    
+    # the task totals of every user are sent along, so drilling down on a
+    # click happens in the browser (render_chart in assets/clientside.js)
+    labels = list(entries_by_date['User Name'].unique())
+    # check all known labels, the click can outlive a date change
+    click = _get_click(clickData)
+    if click in dataset.dimensions['User Name'] and click not in labels:
+        labels.append(click)
+    
+    top = visualizations.plot_team(entries_by_date, mode='Users')
+    drilldown = visualizations.drilldown_totals(entries_by_date, 'User Name',
+                                                labels)
+    return visualizations.drilldown_figures(top, drilldown,
+                                            empty=entries_by_date.empty)
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='drilldown', function_name='render_chart'),
+    Output('team-chart', 'figure'),
+    [Input('team-figures', 'data'),
      Input('team-chart', 'clickData')]
 )
-def update_project_chart(name, start_date, end_date, clickData):
+
+
+### UPDATE TABLE ###
+def _get_entries(project, start_date, end_date, click=None):
+    """returns the project's entries in the date range (and clicked user),
+    newest first"""
     # parse dates from calendar
     start_date = dt.strptime(re.split('T| ', start_date)[0], '%Y-%m-%d')
     end_date = dt.strptime(re.split('T| ', end_date)[0], '%Y-%m-%d')
     
-    if clickData is None:
-        mode = 'Users'
-        user = None
-    else:
-        click = clickData['points'][0]['y']
-        print(click)
-        if click in list(task_entries['User Name'].values):
-            mode = 'Tasks'
-            user = click
-        elif click in list(task_entries['Task Name'].values):
+    # project's entries in the date range, oldest first
+    dataset = get_dataset()
+    dimensions = dataset.dimensions
+    entries_by_date = dataset.query('tasks_by_project', project, 
+                                    start_date, end_date)
+    if click:
+        # check all known labels, the click can outlive a date change
+        if click in dimensions['User Name']:
+            filt = entries_by_date['User Name'] == click
+            entries_by_date = entries_by_date.loc[filt]
+        elif click in dimensions['Task Name']:
             raise PreventUpdate
-        
-    fig = visualizations.plot_team(
-                task_entries, name, start_date, end_date, mode=mode, 
-                user=user
-                )
-    return fig
+    
+    # newest first
+    return entries_by_date[table_columns].iloc[::-1]
+
+
+@app.callback(
+    Output('entry-table-team', 'data'),
+    Output('entry-table-team', 'page_count'),
+    Output('entry-table-team', 'page_current'),
+    [Input('select-project', 'value'),
+     Input('date-picker-range', 'start_date'),
+     Input('date-picker-range', 'end_date'),
+     Input('team-chart', 'clickData'),
+     Input('entry-table-team', 'page_current'),
+     Input('entry-table-team', 'sort_by'),
+     Input('entry-table-team', 'filter_query')]
+)
+def update_entry_table(project, start_date, end_date, clickData, 
+                       page_current, sort_by, filter_query):
+    if not project:
+        return [], 1, 0
+    
+    df = _get_entries(project, start_date, end_date, _get_click(clickData))
+    # back to the first page unless the page itself was changed
+    if callback_context.triggered[0]['prop_id'] != 'entry-table-team.page_current':
+        page_current = 0
+    page, page_count, page_current = query_table(df, filter_query, sort_by, 
+                                                 page_current)
+    page = page.copy()
+    page['Hours Date'] = page['Hours Date'].dt.date
+    
+    return page.to_dict('records'), page_count, page_current
 
 
-### UPDATE TABLE ###
 @app.callback(
-    Output('entry-table-team', 'children'),
     Output('download-link-team', 'href'),
     [Input('select-project', 'value'),
      Input('date-picker-range', 'start_date'),
      Input('date-picker-range', 'end_date'),
      Input('team-chart', 'clickData')]
 )
-def update_entry_table(project, start_date, end_date, clickData):
-    # parse dates from calendar
-    start_date = dt.strptime(re.split('T| ', start_date)[0], '%Y-%m-%d')
-    end_date = dt.strptime(re.split('T| ', end_date)[0], '%Y-%m-%d')
+def update_download_link(project, start_date, end_date, clickData):
+    if not project:
+        raise PreventUpdate
     
-    if project:
-        filt = ((task_entries['Project'] == project) 
-                & (task_entries['Hours Date'] >= start_date)
-                & (task_entries['Hours Date'] <= end_date))
-        if clickData:
-            click = clickData['points'][0]['y']
-            if click in list(task_entries['User Name'].values):
-                filt = ((task_entries['Project'] == project) 
-                    & (task_entries['Hours Date'] >= start_date)
-                    & (task_entries['Hours Date'] <= end_date)
-                    & (task_entries['User Name'] == click))
-            elif click in list(task_entries['Task Name'].values):
-                raise PreventUpdate               
-                
-        columns = ['Classification', 'User Name', 'Task Name', 'Hours Date', 
-                   'Entered Hours', 'Comments']
-        df = task_entries.loc[filt, columns]
-        df.sort_values('Hours Date', ascending=False, inplace=True)
-        df['Hours Date'] = df['Hours Date'].dt.date
-        
-        table = dash_table.DataTable(
-            columns = [{"name": i, "id": i} for i in df.columns],
-            data = df.to_dict('records'),
-            filter_action='native',
-            sort_action='native',
-            sort_mode='multi',
-            style_cell={
-                'whiteSpace': 'normal',
-                'height': 'auto',
-                'minWidth': '30px', 'width': '30px', 'maxWidth': '30px',
-                'textAlign': 'center',
-                'font-family': 'Calibri, Arial',
-                'font-size': 14,
-                'font-color': 'darkgrey'
-            },
-            style_header={
-                'backgroundColor': 'white',
-                'fontWeight': 'bold'
-            },
-            style_data_conditional=[
-                {'if': {'row_index': 'odd'},
-                 'backgroundColor': 'rgb(248, 248, 248)'},
-                # {'if': {'column_id': 'Task ID'},
-                # 'width': '15%'},
-                # {'if': {'column_id': 'Task Name'},
-                # 'width': '25%'},
-                # {'if': {'column_id': 'Hours Date'},
-                # 'width': '15%'},
-                # {'if': {'column_id': 'Entered Hours'},
-                # 'width': '15%'},
-                {'if': {'column_id': 'Comments'},
-                'width': '60px','textAlign': 'left'}
-            ],
-            page_action = 'none',  # implement back-end sorting if paging
-            fixed_rows = {'headers': True},
-            style_table={'height': '500px', 
-                         'overflowY': 'auto',
-                         'overflowX': 'auto'},
-            style_as_list_view=True,
-        )
-        
-        # Convert DataFrame to JSON
-        csv_string = df.to_csv(index=False, encoding='utf-8')
-        csv_string = "data:text/csv;charset=utf-8,%EF%BB%BF" + urllib.parse.quote(csv_string)
-        # df_json = df.to_json(date_format='iso', orient='split')
-        return table, csv_string
+    click = _get_click(clickData)
+    # raises PreventUpdate on a task click, keeping the project's link
+    _get_entries(project, start_date, end_date, click)
+    
+    # the csv is built when the link is clicked
+    return download_url('/download/team-entries.csv', project=project, 
+                        start_date=start_date, end_date=end_date, click=click)
+
+
+@server.route('/download/team-entries.csv')
+def download_team_entries():
+    args = request.args
+    try:
+        df = _get_entries(args['project'], args['start_date'], args['end_date'], 
+                          args.get('click'))
+    except (KeyError, ValueError, PreventUpdate):
+        abort(400)
+    df = df.copy()
+    df['Hours Date'] = df['Hours Date'].dt.date
+    
+    return stream_csv(df, 'entries.csv')
 
 # enable reset button
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='drilldown', function_name='enable_reset'),
     Output('clear-clickData-team', 'disabled'),
     [Input('team-chart', 'clickData')]
 )
-def enable_reset(clickData):
-    return clickData is None
 
 
 # reset team chart
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='drilldown', function_name='clear_click'),
     Output('team-chart', 'clickData'),
     [Input('clear-clickData-team', 'n_clicks'),
-     Input('select-project', 'value')]
+     Input('select-project', 'value')],
+    [State('team-chart', 'clickData')]
 )
-def clear_clickData(n_clicks, project):
-    if n_clicks or project:
-        return None
     
 # UPDATE VALID THROUGH TEXT ###
 def _get_last_valid_date(project, start_date, end_date):
     """returns last valid date as datetime"""
+    task_entries = get_dataset().task_entries
     # get list of names who billed during the period
     filt = ((task_entries['Project'] == project) 
             & (task_entries['Hours Date'] >= start_date)
@@ -2,18 +2,25 @@ from dash import dcc
 from dash import html
 import dash_bootstrap_components as dbc
 import dash_daq as daq
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
+from dash import callback_context, no_update, Patch
 from flask import request
 from datetime import datetime as dt
 import json
+import os
 import pandas as pd
 
-from components import visualizations
-from apps.data import usernames, hours_report, hours_entries
+from components import visualizations, utils
+from components.memo import MemoCache, FIGURE_CACHE_SIZE
+from apps.data import usernames, get_dataset
 
 from app import app
 
+# 'client' redraws the prediction in the browser while the slider is
+# dragged, 'server' redraws it in a callback when the slider is let go
+SLIDER_MODE = os.environ.get('UTIL_SLIDER_MODE', 'client')
+
 ### ----------------------------- LAYOUT --------------------------------- ###
 
 ### INSTRUCTIONS ###
@@ -87,7 +94,8 @@ util_slider = daq.Slider(
     handleLabel={"showCurrentValue": True,"label": "%"},
     labelPosition='top',
     size=265*1.3,
-    updatemode='mouseup',  #'drag' for on-the-fly updates,
+    # on-the-fly updates when they don't cost a callback
+    updatemode='drag' if SLIDER_MODE == 'client' else 'mouseup',
     color='green',
     marks={'0': 'OFF'}
 )  
@@ -107,6 +115,24 @@ valid_thru = dbc.Container(html.Div(id='valid-thru'),
                                   'textAlign': 'left'})
 
 
+### HISTORY START ###
+# first date of the history drawn in the chart, older years are only
+# loaded when the chart is panned back past it
+history_start = dcc.Store(id='history-start')
+
+
+### UTILIZATION BASE ###
+# in client mode, the chart at the user's utilization to date and the
+# prediction components to redraw it at the slider's
+utilization_base = dcc.Store(id='utilization-base')
+
+
+### UTILIZATION VERSION ###
+# in server mode, the data version of the chart shown, slider moves only
+# send the parts that changed while it's current
+utilization_version = dcc.Store(id='utilization-version')
+
+
 ### UPDATE TRIGGER ###
 fire_me = html.Div(id='fire', children=[], style={'display': 'none'})
 '''
@@ -124,6 +150,9 @@ layout = html.Div([
     html.Br(),
     valid_thru,
     html.Br(),
+    history_start,
+    utilization_base,
+    utilization_version,
     fire_me
 ])
 
@@ -136,9 +165,8 @@ layout = html.Div([
     [Input('fire', 'children')]
 )
 def populate_names(_):
-    # get list of unique names
-    names = hours_report['User Name'].unique()
-    names.sort()
+    # names of every year, not only the loaded ones
+    names = sorted(get_dataset().dimensions['User Name'].labels)
     options = [{'label': name, 'value': name} for name in names]
     initial_user = usernames.get(request.authorization['username']) 
         
@@ -146,28 +174,150 @@ def populate_names(_):
 
 
 ### UPDATE UTILIZATION CHART ###
-@app.callback(
-    Output('utilization-chart', 'figure'),
-    [Input('select-name', 'value'),
-     Input('util-slider', 'value'),
-     Input('reset-axes', 'n_clicks')]
-)
-def update_utilization_chart(name, predict_input, n_clicks):
-    if name or n_clicks:
-        return visualizations.plot_utilization(
-            hours_report, name, predict_input
-            )
-    else:
-        raise PreventUpdate
+# most staff open the same page on Monday morning, keep their figures
+figure_cache = MemoCache(FIGURE_CACHE_SIZE, name='figures')
+
+
+def _get_view_start(relayoutData):
+    """returns the left edge of the x axis after a pan, or None"""
+    if not relayoutData:
+        return None
+    if 'xaxis.range[0]' in relayoutData:
+        return pd.to_datetime(relayoutData['xaxis.range[0]'])
+    if 'xaxis.range' in relayoutData:
+        return pd.to_datetime(relayoutData['xaxis.range'][0])
+    return None
+
+
+def _get_start_date(trigger, relayoutData, history_start):
+    """returns the first date of the history to draw"""
+    if trigger == 'utilization-chart.relayoutData':
+        # only redraw when panning back past the history already drawn
+        view_start = _get_view_start(relayoutData)
+        if (view_start is None or history_start is None 
+                or view_start >= pd.to_datetime(history_start)):
+            raise PreventUpdate
+        return view_start
+    if trigger == 'util-slider.value' and history_start:
+        return pd.to_datetime(history_start)
+    return visualizations.period_start
+
+
+def _get_chart(dataset, name, start_date):
+    """returns name's chart drawn at their utilization to date, cached:
+    (figure json, first date drawn, prediction component arrays,
+    visualizations.prediction_patch)"""
+    # the figure also depends on how many years of history it draws
+    n_years = len(dataset.partitions.covering(start_date))
+    
+    def build():
+        # drawn at the user's utilization to date, with the parts that
+        # change with the slider noted
+        components = dataset.predictions(start_date)
+        idf = components[components['User Name'] == name]
+        max_DT = idf.loc[idf['Predicted'], 'DT'].min()
+        fig = visualizations.plot_prediction(idf, max_DT)
+        arrays = {col: idf[col].to_numpy() for col in utils.COMPONENT_COLUMNS}
+        return (fig.to_json(), components['DT'].min().isoformat(), arrays,
+                visualizations.prediction_patch(fig, idf))
+    
+    return figure_cache.get_or_build((name, dataset.version, n_years), build)
+
+
+if SLIDER_MODE == 'client':
+    # the server sends the chart at the user's utilization to date with
+    # what's needed to redraw it at another, the slider redraws it in the
+    # browser (see assets/clientside.js)
+    @app.callback(
+        [Output('utilization-base', 'data'),
+         Output('history-start', 'data')],
+        [Input('select-name', 'value'),
+         Input('reset-axes', 'n_clicks'),
+         Input('utilization-chart', 'relayoutData')],
+        [State('history-start', 'data')]
+    )
+    def update_utilization_base(name, n_clicks, relayoutData, history_start):
+        if not (name or n_clicks):
+            raise PreventUpdate
+
+        trigger = callback_context.triggered[0]['prop_id']
+        start_date = _get_start_date(trigger, relayoutData, history_start)
+        fig_json, drawn_start, arrays, patch = _get_chart(get_dataset(), name,
+                                                          start_date)
+        fig = json.loads(fig_json)
+        # keep the panned view across slider moves, reset on name or Back
+        fig['layout']['uirevision'] = f'{name}-{n_clicks}'
+        lines, annotation = patch
+        base = {
+            'figure': fig,
+            'components': {col: arrays[col].tolist() for col in [
+                'Fixed Billable to Date', 'Predicted MEH to Date',
+                'MEH to Date']},
+            'lines': [[i, positions.tolist()] for i, positions in lines],
+            'annotation': annotation.tolist(),
+        }
+        return base, drawn_start
+
+
+    app.clientside_callback(
+        ClientsideFunction(namespace='utilization', function_name='render_chart'),
+        Output('utilization-chart', 'figure'),
+        [Input('utilization-base', 'data'),
+         Input('util-slider', 'value')]
+    )
+
+else:
+    @app.callback(
+        [Output('utilization-chart', 'figure'),
+         Output('history-start', 'data'),
+         Output('utilization-version', 'data')],
+        [Input('select-name', 'value'),
+         Input('util-slider', 'value'),
+         Input('reset-axes', 'n_clicks'),
+         Input('utilization-chart', 'relayoutData')],
+        [State('history-start', 'data'),
+         State('utilization-version', 'data')]
+    )
+    def update_utilization_chart(name, predict_input, n_clicks, relayoutData, 
+                                 history_start, drawn_version):
+        if not (name or n_clicks):
+            raise PreventUpdate
+        
+        triggers = {t['prop_id'] for t in callback_context.triggered}
+        trigger = callback_context.triggered[0]['prop_id']
+        start_date = _get_start_date(trigger, relayoutData, history_start)
+        dataset = get_dataset()
+        fig_json, drawn_start, arrays, patch = _get_chart(dataset, name,
+                                                          start_date)
+        if (triggers == {'util-slider.value'} 
+                and drawn_version == dataset.version):
+            # the chart shown is this one at another slider position, only
+            # send its predicted traces and annotation
+            fig = visualizations.set_predicted_utilization(
+                Patch(), arrays, patch, predict_input)
+            return fig, no_update, no_update
+        
+        fig = json.loads(fig_json)
+        if predict_input:
+            fig = visualizations.set_predicted_utilization(fig, arrays, patch,
+                                                           predict_input)
+        # keep the panned view across slider moves, reset on name or Back
+        fig['layout']['uirevision'] = f'{name}-{n_clicks}'
+        
+        return fig, drawn_start, dataset.version
 
 
 # UPDATE VALID THROUGH TEXT ###
 def _get_last_valid_date(name):
     """returns last valid date as datetime"""
-    filt = ((hours_entries['User Name'] == name) 
-            & (hours_entries['Hours Date'] <= dt.today()))
-    current_hours = hours_entries.loc[filt, 'Hours Date']
-    max_DT = current_hours.max()
+    partitions = get_dataset().partitions
+    current_hours = partitions.current['entries_by_user'].query(
+        name, end_date=dt.today())
+    if current_hours.empty:
+        # someone who left in an earlier year, look through the history
+        current_hours = partitions.query('entries_by_user', name,
+                                         end_date=dt.today())
+    max_DT = current_hours['Hours Date'].max()
     return max_DT
 
 @app.callback(
@@ -176,6 +326,8 @@ def _get_last_valid_date(name):
 )
 def get_valid_thru(name):
     max_DT = _get_last_valid_date(name)
+    if pd.isna(max_DT):
+        return 'No hours entered'
     max_DT_s = max_DT.strftime('%A, %B %e, %Y')
     text = f'Data valid through: {max_DT_s}'
     return text
@@ -0,0 +1,128 @@
+// clientside callbacks for the drill-down charts on the projects and team
+// pages, registered in apps/projects.py and apps/team.py, and for the
+// utilization slider, registered in apps/utilization.py
+
+// a bar's tasks drawn like plot_projects and plot_team's Tasks mode in
+// components/visualizations.py: hours left of each bar and, given the
+// expected hours of the date range, the share of them right of it
+function drilldown_figure(totals, meh, template) {
+    var grey = '#5F5F5F';
+    var hours_text = [];
+    var share_text = [];
+    totals.hours.forEach(function(hours, i) {
+        if (hours <= 0) {
+            return;
+        }
+        hours_text.push({
+            x: 0, y: i, xanchor: 'right', showarrow: false,
+            font: {color: grey},
+            text: hours.toLocaleString('en-US', {minimumFractionDigits: 1,
+                                                 maximumFractionDigits: 1})
+        });
+        if (meh) {
+            share_text.push({
+                x: hours, y: i, xanchor: 'left', showarrow: false,
+                font: {color: grey},
+                text: (hours / meh * 100).toFixed(0) + '%'
+            });
+        }
+    });
+    var num_bars = totals.tasks.length;
+    var bottom_margin = num_bars < 5 ? 200 : 80;
+    return {
+        data: [{
+            type: 'bar', name: 'Tasks', orientation: 'h', width: 0.7,
+            showlegend: false, x: totals.hours, y: totals.tasks
+        }],
+        layout: {
+            template: template,
+            annotations: hours_text.concat(share_text),
+            xaxis: {showgrid: true},
+            yaxis: {showgrid: false},
+            plot_bgcolor: 'white',
+            autosize: false,
+            height: (num_bars - 1) * 40 + (60 + bottom_margin),
+            margin: {l: 0, r: 0, t: 20, b: bottom_margin, pad: 30},
+            font: {family: 'Calibri, Arial', size: 14, color: grey}
+        }
+    };
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    drilldown: {
+        // Back is only enabled once a bar was clicked
+        enable_reset: function(clickData) {
+            return !clickData;
+        },
+
+        // Back, or picking another name or project, clears the click.
+        // Skipped if it's already clear, so the chart and table don't
+        // update twice
+        clear_click: function(n_clicks, value, clickData) {
+            if (!clickData) {
+                return window.dash_clientside.no_update;
+            }
+            return null;
+        },
+
+        // figures holds the top level chart and the task totals behind
+        // each of its bars, built on the server when the name, project or
+        // dates change. Clicking a bar draws its tasks here, without a
+        // round trip
+        render_chart: function(figures, clickData) {
+            if (!figures) {
+                return window.dash_clientside.no_update;
+            }
+            if (!clickData || figures.empty) {
+                return figures.top;
+            }
+            var click = clickData.points[0].y;
+            if (!(click in figures.drilldown)) {
+                // a task bar, stay on the tasks
+                return window.dash_clientside.no_update;
+            }
+            return drilldown_figure(figures.drilldown[click], figures.meh,
+                                    figures.top.layout.template);
+        }
+    },
+
+    utilization: {
+        // base holds the chart drawn at the user's utilization to date and
+        // the running totals of utils.prediction_components, so a slider
+        // position only costs a multiply-add and a divide per month
+        render_chart: function(base, predict_input) {
+            if (!base) {
+                return window.dash_clientside.no_update;
+            }
+            if (!predict_input) {
+                return base.figure;
+            }
+            var components = base.components;
+            var rate = predict_input / 100;
+            var average = function(i) {
+                return (components['Fixed Billable to Date'][i]
+                        + rate * components['Predicted MEH to Date'][i])
+                       / components['MEH to Date'][i];
+            };
+
+            // copy only what changes, the stored figure is reused
+            var data = base.figure.data.slice();
+            base.lines.forEach(function(line) {
+                data[line[0]] = Object.assign({}, data[line[0]],
+                                              {y: line[1].map(average)});
+            });
+            var layout = base.figure.layout;
+            if (base.annotation.length) {
+                var predicted = average(base.annotation[0]);
+                var annotations = layout.annotations.slice();
+                annotations[0] = Object.assign({}, annotations[0], {
+                    y: predicted,
+                    text: 'Predicted<br>Utilization ('
+                          + (predicted * 100).toFixed(0) + '%)'
+                });
+                layout = Object.assign({}, layout, {annotations: annotations});
+            }
+            return {data: data, layout: layout};
+        }
+    }
+});
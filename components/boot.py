@@ -0,0 +1,88 @@
+"""stage timings and frame sizes recorded while the app boots
+
+Loading code wraps its steps in `stage(name)` and registers the frames it
+builds with `frame(name, df)`. Everything is collected on one BootReport,
+printed as a single JSON line ("boot report {...}") once the app is ready,
+so a slow boot can be traced to the stage that regressed. Stages run after
+the report was emitted (refreshes, lazily loaded history) aren't recorded.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+def peak_rss_mb():
+    """returns the peak resident memory of the process in MB"""
+    if resource is None:
+        return None
+    # linux reports KB
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1)
+
+
+class BootReport:
+    """wall time per stage and size per frame, collected across threads"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = []
+        self.frames = {}
+        self.emitted = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            stop = time.perf_counter()
+            with self._lock:
+                if not self.emitted:
+                    # start offsets show which stages overlapped
+                    self.stages.append({
+                        'stage': name,
+                        'start': round(start - self.started, 3),
+                        'seconds': round(stop - start, 3),
+                        'thread': threading.current_thread().name,
+                    })
+
+    def frame(self, name, df):
+        with self._lock:
+            if not self.emitted:
+                self.frames[name] = {
+                    'rows': len(df),
+                    'columns': len(df.columns),
+                    'bytes': int(df.memory_usage(deep=True).sum()),
+                }
+
+    def record(self):
+        """returns the report as a dict"""
+        return {
+            'seconds': round(time.perf_counter() - self.started, 3),
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+            'frames': self.frames,
+            'frame_mb': round(sum(f['bytes'] for f in self.frames.values())
+                              / 2**20, 1),
+        }
+
+    def emit(self):
+        """print the report once, as one line"""
+        with self._lock:
+            if self.emitted:
+                return
+            self.emitted = True
+        print('boot report ' + json.dumps(self.record()))
+
+
+# started when the app (or the gunicorn master) first imports this module
+boot_report = BootReport()
+stage = boot_report.stage
+frame = boot_report.frame
@@ -0,0 +1,31 @@
+"""stream frames to the browser as csv downloads
+
+Download links point at a route that builds the csv when it's clicked,
+instead of callbacks encoding the whole csv into the link's href on every
+change. The csv is written and sent a chunk of rows at a time.
+"""
+
+import urllib.parse
+from flask import Response
+
+CSV_CHUNK_ROWS = 5000
+
+
+def download_url(route, **params):
+    """returns route with params (None values dropped) as a query string"""
+    params = {key: value for key, value in params.items() if value is not None}
+    return route + '?' + urllib.parse.urlencode(params)
+
+
+def stream_csv(df, filename, chunk_rows=CSV_CHUNK_ROWS):
+    """returns a response streaming df as a utf-8 csv attachment"""
+    def generate():
+        # byte order mark so Excel opens it as utf-8
+        yield '\ufeff' + df.iloc[:0].to_csv(index=False)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].to_csv(index=False,
+                                                           header=False)
+
+    return Response(generate(), mimetype='text/csv', headers={
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    })
@@ -0,0 +1,128 @@
+"""versioned dataset reference with background refresh
+
+All frames from one load live on a Dataset, which is never mutated after it
+is built. Callbacks take the current dataset once with get_dataset() and use
+it throughout, so a refresh that swaps in a new dataset mid-request can't
+hand them a mix of old and new frames. dataset.version changes with every
+swap and can be used to key caches.
+"""
+
+import hashlib
+import os
+import threading
+import time
+import pandas as pd
+
+from components.memo import MemoCache, SLICE_CACHE_SIZE, log_stats
+from components.utils import prediction_components
+
+# seconds between revision checks, 0 disables the refresher
+REFRESH_INTERVAL = int(os.environ.get('REFRESH_INTERVAL', 900))
+
+def version_token(revisions):
+    """returns a short token for a list of spreadsheet revisions"""
+    return hashlib.sha1('|'.join(revisions).encode()).hexdigest()[:10]
+
+
+class Dataset:
+    """one consistent load of the app's data"""
+
+    def __init__(self, version, partitions, forecasts, dimensions):
+        self.version = version
+        self.partitions = partitions
+        self.forecasts = forecasts
+        # label <-> code tables shared by all frames of the load
+        self.dimensions = dimensions
+        # slices queried by callbacks, shared by the callbacks that fire on
+        # the same inputs (chart, table, download link) and by table paging,
+        # cleared when the dataset is swapped out
+        self.slices = MemoCache(SLICE_CACHE_SIZE, name='slices')
+
+    @property
+    def hours_report(self):
+        return self.partitions.current['hours_report']
+
+    @property
+    def hours_entries(self):
+        return self.partitions.current['hours_entries']
+
+    @property
+    def task_entries(self):
+        return self.partitions.current['task_entries']
+
+    def query(self, name, value, start_date=None, end_date=None):
+        """partitions.query, memoized by filter. The slice is shared between
+        callbacks, don't modify it in place"""
+        key = (name, value,
+               start_date and pd.Timestamp(start_date),
+               end_date and pd.Timestamp(end_date))
+        # copied, a cached view would keep its whole partition alive after
+        # the partition is evicted
+        return self.slices.get_or_build(key, lambda: self.partitions.query(
+            name, value, start_date, end_date).copy())
+
+    def predictions(self, start_date=None):
+        """prediction_components of the hours report covering start_date
+        onwards, for every user. Memoized like query, by the number of
+        years covered"""
+        n_years = len(self.partitions.covering(start_date))
+        key = ('predictions', n_years)
+        return self.slices.get_or_build(key, lambda: prediction_components(
+            self.partitions.frames('hours_report', start_date)))
+
+
+_dataset = None
+
+
+def get_dataset():
+    """returns the current dataset"""
+    return _dataset
+
+
+def set_dataset(dataset):
+    """swap in a fully built dataset (a single reference assignment, so
+    readers see either the old or the new one)"""
+    global _dataset
+    previous, _dataset = _dataset, dataset
+    if previous is not None:
+        # requests still on the old dataset rebuild what they need
+        previous.slices.clear()
+    print(f'dataset version {dataset.version}')
+
+
+class Refresher(threading.Thread):
+    """polls an upstream version token and reloads when it changes"""
+
+    def __init__(self, get_version, reload, version, interval=REFRESH_INTERVAL):
+        """
+        :param get_version: callable returning the upstream version token
+        :param reload: callable that loads and swaps in the new data,
+            returning the version it loaded
+        :param version: version currently loaded
+        :param interval: seconds between checks
+        """
+        super().__init__(name='dataset-refresher', daemon=True)
+        self.get_version = get_version
+        self.reload = reload
+        self.version = version
+        self.interval = interval
+
+    def refresh(self):
+        """reload if upstream changed, returns True if it did"""
+        version = self.get_version()
+        if version == self.version:
+            return False
+        print(f'new data version {version}, reloading')
+        # built off to the side, the old data serves until the swap
+        self.version = self.reload()
+        return True
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                # keep serving the current data, try again next time
+                print(f'dataset refresh failed: {e!r}')
+            log_stats()
@@ -0,0 +1,100 @@
+"""integer-coded dimension tables for the labels repeated in the hours frames
+
+Each Dimension maps the labels of one kind (users, projects, task names,
+classifications) to integer codes, with a dict for O(1) membership and
+lookup. Fact frames keep only the codes: their label columns are
+categoricals over the dimension's labels, so every frame and every year
+partition shares one set of categories. Comparing a column with a label
+compares codes, and frames from different years concatenate by stacking
+their codes instead of re-coding them.
+
+Dimensions only grow. Labels first seen in a later (older) year are added
+to the end, so frames coded earlier stay valid, their categories are a
+prefix of the dimension's.
+"""
+
+import threading
+import numpy as np
+import pandas as pd
+
+# label columns, coded by the dimension of the same name
+DIMENSION_COLUMNS = ['User Name', 'Project', 'Task Name', 'Classification']
+
+# the team frames show indirect time by task in the Project column, keep
+# those labels out of the projects dimension
+TEAM_PROJECT = 'Team Project'
+
+
+class Dimension:
+    """append-only table of labels and their integer codes"""
+
+    def __init__(self, labels=()):
+        """
+        :param labels: labels to start with, coded in the order given
+        """
+        self.labels = list(labels)
+        self.codes = {label: code for code, label in enumerate(self.labels)}
+        self.dtype = pd.CategoricalDtype(self.labels)
+        self._lock = threading.Lock()
+
+    def __contains__(self, label):
+        return label in self.codes
+
+    def __len__(self):
+        return len(self.labels)
+
+    def code(self, label):
+        """returns the code of label, -1 if unknown"""
+        return self.codes.get(label, -1)
+
+    def add(self, labels):
+        """add unknown labels (sorted) to the end, returns the dtype"""
+        with self._lock:
+            new = {label for label in labels
+                   if label not in self.codes and not pd.isna(label)}
+            if new:
+                for label in sorted(new, key=str):
+                    self.codes[label] = len(self.labels)
+                    self.labels.append(label)
+                self.dtype = pd.CategoricalDtype(self.labels)
+            return self.dtype
+
+    def encode(self, s):
+        """returns s as a categorical coded against the dimension"""
+        if not isinstance(s.dtype, pd.CategoricalDtype):
+            s = s.astype('category')
+        dtype = self.add(s.cat.categories)
+        # map s's codes to the dimension's, the last entry maps nan (-1)
+        mapping = np.array([self.codes[label] for label in s.cat.categories]
+                           + [-1])
+        codes = mapping[s.cat.codes.to_numpy()]
+        return pd.Series(pd.Categorical.from_codes(codes, dtype=dtype),
+                         index=s.index, name=s.name)
+
+
+class Dimensions(dict):
+    """dimension name -> Dimension"""
+
+    def __init__(self, labels=None):
+        """
+        :param labels: dict of dimension name to labels, e.g. published
+            by another process
+        """
+        labels = labels or {}
+        super().__init__({name: Dimension(labels.get(name, ()))
+                          for name in DIMENSION_COLUMNS + [TEAM_PROJECT]})
+
+    def encode(self, df, dimensions=None):
+        """code the dimension columns of df in place
+        :param dimensions: dict of column to dimension name for columns
+            not coded by the dimension of the same name
+        """
+        dimensions = dimensions or {}
+        for col in DIMENSION_COLUMNS:
+            if col in df.columns:
+                df[col] = self[dimensions.get(col, col)].encode(df[col])
+        return df
+
+    def labels(self):
+        """returns dimension name -> labels, in code order"""
+        return {name: list(dimension.labels) for name, dimension in self.items()}
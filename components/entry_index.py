@@ -0,0 +1,49 @@
+"""sorted index over hours entries for key + date range lookups
+
+Entries are sorted once by (key, Hours Date) and the row range of each key
+is recorded, so selecting one user's (or project's) entries in a date range
+is a dict lookup and two binary searches instead of boolean masks over the
+whole frame. Results come back sorted by date.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class EntryIndex:
+    """entries sorted by (key, date) with per-key row offsets"""
+
+    def __init__(self, df, key='User Name', date_col='Hours Date',
+                 presorted=False):
+        self.key = key
+        self.date_col = date_col
+        if presorted:
+            # e.g. frames mapped from shared memory, sorting would copy them
+            self.df = df
+        else:
+            self.df = (df.sort_values([key, date_col], kind='stable')
+                       .reset_index(drop=True))
+        self.dates = self.df[date_col].to_numpy()
+
+        # first row of each key, rows of a key are contiguous once sorted
+        keys = self.df[key]
+        starts = np.flatnonzero(~keys.duplicated().to_numpy())
+        stops = np.append(starts[1:], len(keys))
+        self.offsets = dict(zip(keys.to_numpy()[starts], zip(starts, stops)))
+
+    def __contains__(self, value):
+        return value in self.offsets
+
+    def query(self, value, start_date=None, end_date=None):
+        """returns entries for value with start_date <= date <= end_date,
+        sorted by date. Open ended if a date is None."""
+        start, stop = self.offsets.get(value, (0, 0))
+        dates = self.dates[start:stop]
+        lo, hi = 0, len(dates)
+        if start_date is not None:
+            lo = np.searchsorted(dates, pd.Timestamp(start_date).to_datetime64(),
+                                 side='left')
+        if end_date is not None:
+            hi = np.searchsorted(dates, pd.Timestamp(end_date).to_datetime64(),
+                                 side='right')
+        return self.df.iloc[start + lo:start + max(lo, hi)]
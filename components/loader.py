@@ -0,0 +1,31 @@
+"""concurrent loading of worksheets at startup"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# each fetch is a network round trip plus json decode, mostly waiting on IO
+MAX_WORKERS = int(os.environ.get('LOAD_WORKERS', 8))
+
+
+def load_reports(storage, sheets, max_workers=MAX_WORKERS, optional=()):
+    """Load worksheets in parallel with a bounded thread pool.
+    :param storage: storage backend, see components/storage.py
+    :param sheets: list of (spreadsheet, sheet_title, revision) tuples
+    :param max_workers: maximum number of concurrent fetches
+    :param optional: sheet titles that may fail to load, logged and
+        returned as None instead of raising
+    :returns list of dataframes in the same order as sheets
+    """
+    def load(sheet):
+        spreadsheet, sheet_title, revision = sheet
+        try:
+            return storage.read(spreadsheet, sheet_title, revision=revision)
+        except Exception as e:
+            if sheet_title not in optional:
+                raise
+            print(f'{spreadsheet}/{sheet_title} not loaded ({e!r})')
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # map yields results in submission order, whatever finishes first
+        return list(pool.map(load, sheets))
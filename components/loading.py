@@ -0,0 +1,179 @@
+"""build the app's Dataset from the hours-entries and forecasts sheets
+
+Kept free of import side effects so the gunicorn master can load and
+publish the data (see gunicorn.conf.py) without starting the app.
+"""
+
+import pandas as pd
+
+from components.utils import auth_gspread, build_daily_cube
+from components.storage import get_storage
+from components.loader import load_reports
+from components.partitions import YearPartitions
+from components.entry_index import EntryIndex
+from components.dataset import Dataset, version_token
+from components.dimensions import Dimensions, TEAM_PROJECT
+from components.schema import (HOURS_ENTRIES_SCHEMA, HOURS_REPORT_SCHEMA,
+                               apply_schema)
+from components.boot import stage, frame
+
+# years of history, most recent first. Only the first is loaded at boot,
+# the rest are loaded when a date range or chart reaches back into them
+years = [2024, 2023, 2022, 2021, 2019]
+
+# frames held by each year partition
+PARTITION_FRAMES = ['hours_report', 'hours_entries', 'task_entries',
+                    'hours_cube', 'team_cube']
+
+# frames whose Project column holds indirect time by task
+TEAM_FRAMES = ['task_entries', 'team_cube']
+
+# google sheets, or the local directory in STORAGE_DIR
+storage = get_storage(auth_gspread)
+
+# columns of the small per-year label sheets written by compile_hours
+LABEL_COLUMNS = ['User Name', 'Project', 'Task Name']
+
+# sorted indexes over the partition frames: index -> (frame, key)
+PARTITION_INDEXES = {
+    'entries_by_user': ('hours_entries', 'User Name'),
+    'tasks_by_project': ('task_entries', 'Project'),
+    'cube_by_user': ('hours_cube', 'User Name'),
+    'cube_by_project': ('team_cube', 'Project'),
+}
+
+
+def relabel_indirect(df):
+    """team page shows indirect time by task rather than project"""
+    df = df.copy()
+    filt = df['Project'].isin(['Overhead', 'R&D', 'G&A'])
+    # task names are not project categories, rebuild the categorical
+    df['Project'] = (df['Project'].astype(object)
+                     .mask(filt, df['Task Name'].astype(object))
+                     .astype('category'))
+    return df
+
+
+def index_partition(frames, presorted=False):
+    """returns a partition of frames plus the sorted indexes over them.
+    The partition keeps the sorted frames so they aren't held twice."""
+    partition = dict(frames)
+    with stage('index'):
+        for name, (frame_name, key) in PARTITION_INDEXES.items():
+            index = EntryIndex(frames[frame_name], key, presorted=presorted)
+            partition[frame_name] = index.df
+            partition[name] = index
+    return partition
+
+
+def encode_partition(frames, dimensions):
+    """code the label columns of a partition's frames against dimensions"""
+    with stage('dimensions'):
+        for name, df in frames.items():
+            if name in TEAM_FRAMES:
+                dimensions.encode(df, {'Project': TEAM_PROJECT})
+            else:
+                dimensions.encode(df)
+    return frames
+
+
+def build_partition(hours_report, hours_entries, dimensions):
+    """type a year's frames and derive the frames the pages need"""
+    with stage('types hours_report'):
+        hours_report = apply_schema(hours_report, HOURS_REPORT_SCHEMA)
+    with stage('types hours_entries'):
+        hours_entries = apply_schema(hours_entries, HOURS_ENTRIES_SCHEMA)
+    with stage('relabel indirect'):
+        task_entries = relabel_indirect(hours_entries)
+
+    # daily totals answer the charts, raw entries are only for the tables
+    with stage('daily cube'):
+        hours_cube = build_daily_cube(hours_entries)
+        team_cube = relabel_indirect(hours_cube)
+
+    return index_partition(encode_partition({'hours_report': hours_report,
+                                             'hours_entries': hours_entries,
+                                             'task_entries': task_entries,
+                                             'hours_cube': hours_cube,
+                                             'team_cube': team_cube},
+                                            dimensions))
+
+
+def load_partition(year, dimensions):
+    """load a year of history on demand"""
+    print(f"loading {year} history")
+    hours_report, hours_entries = load_reports(storage, [
+        ('hours-entries', f'{year}-table', None),
+        ('hours-entries', f'{year}-hours', None)
+    ])
+    return build_partition(hours_report, hours_entries, dimensions)
+
+
+def add_labels(dimensions, labels):
+    """Add the user names and team projects of every year to dimensions, so
+    the dropdowns offer names and projects of years not loaded yet. Years
+    without a labels sheet (None) add theirs when their partition loads.
+    :param labels: each year's labels sheet, or None
+    """
+    with stage('labels'):
+        for year, year_labels in zip(years, labels):
+            if year_labels is None:
+                print(f'{year} names offered once its history is loaded')
+                continue
+            dimensions['User Name'].add(year_labels['User Name'].unique())
+            projects = relabel_indirect(year_labels[['Project', 'Task Name']])
+            dimensions[TEAM_PROJECT].add(projects['Project'].unique())
+    return dimensions
+
+
+def get_revisions():
+    """returns the current revision of each spreadsheet the app reads"""
+    revisions = {}
+    for spreadsheet in ['hours-entries', 'forecasts']:
+        with stage(f'revision {spreadsheet}'):
+            revisions[spreadsheet] = storage.revision(spreadsheet)
+    return revisions
+
+
+def get_version():
+    """returns the version token of the data upstream"""
+    return version_token(get_revisions().values())
+
+
+def prepare_forecasts(forecasts):
+    forecasts['Person, ODC, Travel'] = forecasts['Person, ODC, Travel'].str.replace(r'\s+[A-Z]$', '', regex=True)
+    with stage('dates period beginning'):
+        forecasts['period beginning'] = pd.to_datetime(forecasts['period beginning'])
+    filt = forecasts['Project'].str.contains('B&P', case=False, na=False)
+    forecasts.loc[filt, 'Project'] = 'B&P'
+    return forecasts
+
+
+def load_dataset():
+    """load the current year and forecasts into a new Dataset"""
+    # worksheets are served from local snapshots unless they changed upstream
+    revisions = get_revisions()
+
+    # fetch the current year, forecasts and every year's labels
+    # concurrently, a missing labels sheet doesn't fail the boot
+    print("loading hours report, hours entries, forecasts and labels")
+    label_sheets = [f'{year}-labels' for year in years]
+    hours_report, hours_entries, forecasts, *labels = load_reports(storage, [
+        ('hours-entries', f'{years[0]}-table', revisions['hours-entries']),
+        ('hours-entries', f'{years[0]}-hours', revisions['hours-entries']),
+        ('forecasts', 'forecasts', revisions['forecasts'])
+    ] + [('hours-entries', sheet, revisions['hours-entries'])
+         for sheet in label_sheets], optional=label_sheets)
+    # shared by every year of this load, starting with every year's labels
+    dimensions = add_labels(Dimensions(), labels)
+    partitions = YearPartitions(
+        lambda year: load_partition(year, dimensions), years,
+        current=build_partition(hours_report, hours_entries, dimensions)
+    )
+    dataset = Dataset(version_token(revisions.values()), partitions,
+                      prepare_forecasts(forecasts), dimensions)
+
+    for name in PARTITION_FRAMES:
+        frame(name, partitions.current[name])
+    frame('forecasts', dataset.forecasts)
+    return dataset
@@ -0,0 +1,77 @@
+"""bounded memo caches shared by callbacks
+
+Used for built figures, stored serialized (plotly json) so a hit hands out
+a fresh copy that a callback can adjust without touching the cached one,
+and for the slices of the hours frames callbacks query. Figure keys should
+include the dataset version so a refresh never serves stale values, old
+versions simply age out. Slices are cached per Dataset and dropped with it.
+
+Named caches report their counters in a periodic log line ("cache stats
+{...}", see log_stats), to size FIGURE_CACHE_SIZE and SLICE_CACHE_SIZE.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+FIGURE_CACHE_SIZE = int(os.environ.get('FIGURE_CACHE_SIZE', 256))
+SLICE_CACHE_SIZE = int(os.environ.get('SLICE_CACHE_SIZE', 64))
+
+# the latest cache created under each name, reported by log_stats
+_named = {}
+
+
+class MemoCache:
+    """thread safe LRU cache with hit, miss and eviction counters"""
+
+    def __init__(self, maxsize, name=None):
+        """
+        :param maxsize: number of values kept
+        :param name: name to report the cache's stats under, replacing the
+            cache previously created with it
+        """
+        self.maxsize = maxsize
+        self._items = OrderedDict()  # key -> value, LRU first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if name is not None:
+            _named[name] = self
+
+    def get_or_build(self, key, build):
+        """returns the cached value for key, calling build() on a miss"""
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key]
+            self.misses += 1
+        # built outside the lock so other keys aren't held up, two callbacks
+        # missing on the same key at once both build it
+        value = build()
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        """drop every cached value"""
+        with self._lock:
+            self._items.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._items), 'maxsize': self.maxsize,
+                    'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+def log_stats():
+    """print the stats of the named caches as one line"""
+    stats = {name: cache.stats() for name, cache in _named.items()}
+    print('cache stats ' + json.dumps(stats))
@@ -0,0 +1,108 @@
+"""year partitions of the hours history, loaded on demand
+
+The current year is loaded at boot and pinned. Older years are loaded the
+first time a query reaches back before the data already in memory, and are
+evicted least recently used once they exceed a memory budget.
+
+Partitions are disjoint and ordered in time (each year's worksheets only
+hold dates from Jan 1 of that year, before the start of the next year's), so
+a query starting at some date only needs partitions until one starts on or
+before that date.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+
+from components.schema import concat_typed
+
+HISTORY_BUDGET_MB = float(os.environ.get('HISTORY_BUDGET_MB', 150))
+
+
+def partition_size(partition):
+    """returns deep memory usage of a partition's frames in MB (indexes
+    share their frames with the partition)"""
+    return sum(df.memory_usage(deep=True).sum()
+               for df in partition.values()
+               if isinstance(df, pd.DataFrame)) / 2**20
+
+
+def partition_start(year):
+    """returns the first date covered by a year's partition, the year
+    boundary rather than its first entry, which may be days later"""
+    return pd.Timestamp(year, 1, 1)
+
+
+class YearPartitions:
+    """dict-of-frames partitions keyed by year, most recent year pinned"""
+
+    def __init__(self, load_partition, years, current=None,
+                 budget_mb=HISTORY_BUDGET_MB):
+        """
+        :param load_partition: callable taking a year and returning a dict
+            of frame name to dataframe
+        :param years: available years, most recent first
+        :param current: already loaded partition for years[0], loaded if None
+        :param budget_mb: memory budget for the older years
+        """
+        self.load_partition = load_partition
+        self.years = years
+        self.budget_mb = budget_mb
+        self.current = current or load_partition(years[0])
+        self._history = OrderedDict()  # year -> (partition, MB), LRU first
+        self._lock = threading.Lock()
+
+    def get(self, year):
+        """returns the partition for a year, loading it if needed"""
+        if year == self.years[0]:
+            return self.current
+        with self._lock:
+            if year in self._history:
+                self._history.move_to_end(year)
+                return self._history[year][0]
+            # hold the lock while loading so concurrent callbacks reaching
+            # into the same year don't fetch it twice
+            partition = self.load_partition(year)
+            self._history[year] = (partition, partition_size(partition))
+            self._evict()
+            return partition
+
+    def _evict(self):
+        # never evict the partition that was just loaded
+        while (len(self._history) > 1 and
+               sum(mb for _, mb in self._history.values()) > self.budget_mb):
+            year, _ = self._history.popitem(last=False)
+            print(f'evicted {year} history')
+
+    def covering(self, start_date=None):
+        """returns the partitions needed to cover start_date onwards,
+        most recent first. All years if start_date is None."""
+        partitions = []
+        for year in self.years:
+            partitions.append(self.get(year))
+            if (start_date is not None
+                    and partition_start(year) <= pd.Timestamp(start_date)):
+                break
+        return partitions
+
+    def frames(self, name, start_date=None):
+        """returns frame `name` concatenated over the partitions covering
+        start_date onwards"""
+        partitions = self.covering(start_date)
+        if len(partitions) == 1:
+            return partitions[0][name]
+        return concat_typed([partition[name] for partition in partitions])
+
+    def query(self, name, value, start_date=None, end_date=None):
+        """returns value's rows from EntryIndex `name` between start_date
+        and end_date (inclusive), sorted by date across partitions"""
+        # oldest partition first so the pieces are in date order
+        pieces = [partition[name].query(value, start_date, end_date)
+                  for partition in reversed(self.covering(start_date))]
+        if len(pieces) == 1:
+            return pieces[0]
+        return concat_typed(pieces)
+
+    def loaded_years(self):
+        return [self.years[0]] + list(self._history)
@@ -0,0 +1,103 @@
+"""explicit column types for the frames loaded by the app
+
+Frames built from get_all_records come back as int64/float64 and python
+object columns, which is what pushed the hours history over the 550 MB
+dyno limit. Repeated labels are stored as categoricals, hours as float32
+and dates are parsed with explicit formats.
+"""
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from components.boot import stage
+
+# set_dataframe writes datetimes as strings in the first format
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d']
+
+HOURS_CLASSES = ['Billable', 'R&D', 'G&A', 'Marketing & NBD', 'Overhead',
+                 'Time Off', 'Unbillable', 'None']
+
+HOURS_ENTRIES_SCHEMA = {
+    'User Name': 'category',
+    'Project': 'category',
+    'Task Name': 'category',
+    'Task ID': 'category',
+    'Classification': 'category',
+    'Entry Month': 'category',
+    'Entry Year': 'integer',
+    'Employee ID': 'integer',
+    'Entered Hours': 'float32',
+    'Hours Date': 'datetime',
+}
+
+HOURS_REPORT_SCHEMA = {
+    'User Name': 'category',
+    'Entry Month': 'category',
+    'Entry Year': 'integer',
+    'DT': 'datetime',
+    **{col: 'float32' for col in HOURS_CLASSES + [
+        'Total', 'MEH', 'Utilization', 'Util to Date', 'FTE', 'FTE to Date'
+    ]}
+}
+
+
+def parse_dates(s):
+    """parse a column of date strings, trying the known formats before
+    falling back to (slow) per-element inference"""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    with stage(f'dates {s.name}'):
+        for fmt in DATE_FORMATS:
+            try:
+                return pd.to_datetime(s, format=fmt)
+            except (ValueError, TypeError):
+                continue
+        print(f'{s.name}: no explicit date format matched, inferring')
+        return pd.to_datetime(s)
+
+
+def apply_schema(df, schema):
+    """cast the columns of df named in schema, other columns are untouched"""
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == 'category':
+            df[col] = df[col].astype('category')
+        elif kind == 'integer':
+            # downcast to the smallest int, stays float if there are gaps
+            df[col] = pd.to_numeric(df[col], errors='coerce',
+                                    downcast='integer')
+        elif kind == 'datetime':
+            df[col] = parse_dates(df[col])
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(kind)
+    return df
+
+
+def concat_typed(frames):
+    """concat frames, keeping categoricals categorical (pd.concat falls
+    back to object when the categories of the pieces differ)"""
+    with stage('concat'):
+        frames = [df.copy(deep=False) for df in frames]
+        for col in frames[0].columns:
+            if not all(isinstance(df[col].dtype, pd.CategoricalDtype)
+                       for df in frames if col in df.columns):
+                continue
+            dtypes = [df[col].dtype for df in frames if col in df.columns]
+            dtype = max(dtypes, key=lambda d: len(d.categories))
+            if all(dtype.categories[:len(d.categories)].equals(d.categories)
+                   for d in dtypes):
+                # coded against one growing dimension, the codes are
+                # already compatible and only need the widest categories
+                for df in frames:
+                    if col in df.columns and df[col].dtype != dtype:
+                        df[col] = pd.Categorical.from_codes(
+                            df[col].cat.codes, dtype=dtype)
+                continue
+            categories = union_categoricals(
+                [df[col] for df in frames if col in df.columns]).categories
+            for df in frames:
+                if col in df.columns:
+                    df[col] = df[col].cat.set_categories(categories)
+        return pd.concat(frames)
+
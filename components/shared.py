@@ -0,0 +1,151 @@
+"""share loaded frames across gunicorn workers through memory-mapped files
+
+With SHARED_DATA_DIR set, the gunicorn master loads the data once and writes
+every frame as an uncompressed Arrow IPC file under SHARED_DATA_DIR/<version>
+(see gunicorn.conf.py and run_publisher). Workers map those files instead of loading their own
+copy. Numeric, date and string columns stay backed by the mapped pages,
+which the page cache shares between all workers, so adding workers doesn't
+multiply memory. Point SHARED_DATA_DIR at /dev/shm where available.
+"""
+
+import json
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+
+from components.dataset import Dataset, Refresher, REFRESH_INTERVAL
+from components.loading import (PARTITION_FRAMES, encode_partition,
+                                index_partition, years, load_dataset,
+                                get_version)
+from components.dimensions import Dimensions
+from components.boot import boot_report, stage, frame
+from components.partitions import YearPartitions
+
+SHARED_DATA_DIR = os.environ.get('SHARED_DATA_DIR')
+CURRENT = 'CURRENT'
+# previous version is kept for workers that haven't switched over yet
+KEEP_VERSIONS = 2
+# seconds between worker checks for a newly published version
+POLL_INTERVAL = 60
+
+# arrow backed strings map the file instead of building a python str per cell
+_types_mapper = {pa.string(): pd.StringDtype('pyarrow')}.get
+
+
+def write_frame(df, path):
+    """write a frame as an uncompressed (mappable) arrow file"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path + '.tmp', 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + '.tmp', path)
+
+
+def map_frame(path):
+    """returns a frame backed by a memory map of an arrow file"""
+    with stage(f'map {os.path.basename(path)}'):
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        # split_blocks stops pandas consolidating (copying) columns into blocks
+        return table.to_pandas(split_blocks=True, types_mapper=_types_mapper)
+
+
+def published_version(directory=SHARED_DATA_DIR):
+    """returns the version last published to directory, or None"""
+    try:
+        with open(os.path.join(directory, CURRENT)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _remove_old_versions(directory):
+    version_dirs = sorted(
+        (entry.path for entry in os.scandir(directory) if entry.is_dir()),
+        key=os.path.getmtime
+    )
+    # workers that still map a removed file keep their mapping
+    for path in version_dirs[:-KEEP_VERSIONS]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def publish_dataset(dataset, directory=SHARED_DATA_DIR):
+    """write every year of history, the forecasts and the dimensions
+    under directory/<version>, then point CURRENT at it"""
+    version_dir = os.path.join(directory, dataset.version)
+    os.makedirs(version_dir, exist_ok=True)
+
+    partitions = dataset.partitions
+    for year in partitions.years:
+        # older years are loaded one at a time and dropped once written
+        if year == partitions.years[0]:
+            partition = partitions.current
+        else:
+            try:
+                partition = partitions.load_partition(year)
+            except Exception as e:
+                print(f'{year} history not published: {e!r}')
+                continue
+        with stage(f'publish {year}'):
+            for name in PARTITION_FRAMES:
+                write_frame(partition[name],
+                            os.path.join(version_dir, f'{year}-{name}.arrow'))
+    write_frame(dataset.forecasts, os.path.join(version_dir, 'forecasts.arrow'))
+    # written last, it holds the labels added by every year
+    with open(os.path.join(version_dir, 'dimensions.json'), 'w') as f:
+        json.dump(dataset.dimensions.labels(), f)
+
+    # switch workers over atomically
+    path = os.path.join(directory, CURRENT)
+    with open(path + '.tmp', 'w') as f:
+        f.write(dataset.version)
+    os.replace(path + '.tmp', path)
+    _remove_old_versions(directory)
+    print(f'published dataset version {dataset.version} to {directory}')
+
+
+def run_publisher(directory, ready):
+    """Load and publish the data, set ready, then republish whenever the
+    upstream sheets change. Runs in a process of its own started by the
+    gunicorn master, so the master that forks workers runs no reloading
+    threads (a fork while one holds a lock would deadlock the worker).
+    :param ready: multiprocessing event set once the first version is
+        published
+    """
+    def publish():
+        dataset = load_dataset()
+        publish_dataset(dataset, directory)
+        return dataset.version
+
+    refresher = Refresher(get_version, publish, publish())
+    boot_report.emit()
+    ready.set()
+    if REFRESH_INTERVAL:
+        refresher.run()
+
+
+def map_partition(version_dir, year, dimensions):
+    """map a year's frames and rebuild its indexes (frames are already
+    sorted, so the indexes don't copy them)"""
+    frames = {name: map_frame(os.path.join(version_dir, f'{year}-{name}.arrow'))
+              for name in PARTITION_FRAMES}
+    # each file carries the labels known when it was written, a prefix of
+    # the published dimensions
+    return index_partition(encode_partition(frames, dimensions),
+                           presorted=True)
+
+
+def map_dataset(directory=SHARED_DATA_DIR):
+    """returns a Dataset mapping the version last published to directory"""
+    version = published_version(directory)
+    version_dir = os.path.join(directory, version)
+    with open(os.path.join(version_dir, 'dimensions.json')) as f:
+        dimensions = Dimensions(json.load(f))
+    partitions = YearPartitions(
+        lambda year: map_partition(version_dir, year, dimensions), years
+    )
+    forecasts = map_frame(os.path.join(version_dir, 'forecasts.arrow'))
+    for name in PARTITION_FRAMES:
+        frame(name, partitions.current[name])
+    frame('forecasts', forecasts)
+    return Dataset(version, partitions, forecasts, dimensions)
@@ -0,0 +1,151 @@
+"""local parquet snapshots of worksheets loaded from google sheets
+
+Each worksheet loaded through `load_cached_report` is saved to SNAPSHOT_DIR
+as a typed parquet file. A manifest records the spreadsheet revision (drive
+modified time) and the worksheet's fingerprint at the time the snapshot was
+taken: a revision stamp kept in the worksheet's developer metadata, renewed
+by every write (stamp_worksheet). On the next boot the snapshot is served
+from disk if the spreadsheet has not been modified since. If it has, only
+worksheets whose stamp changed are fetched again, so the weekly refresh of
+the current year does not force a download of every previous year.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+import pandas as pd
+
+from components.utils import read_worksheet
+from components.boot import stage
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'data/snapshots')
+MANIFEST = 'manifest.json'
+# developer metadata key of the revision stamp written with each worksheet
+STAMP_KEY = 'content-revision'
+
+_manifest_lock = threading.Lock()
+
+
+def _snapshot_path(spreadsheet, sheet_title):
+    return os.path.join(SNAPSHOT_DIR, f'{spreadsheet}__{sheet_title}.parquet')
+
+
+def read_manifest():
+    """returns the snapshot manifest as a dict keyed by 'spreadsheet/sheet'"""
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _update_manifest(key, entry):
+    # read-modify-write under a lock so concurrent loads don't clobber
+    # each other, and replace atomically so a crash can't truncate it
+    with _manifest_lock:
+        manifest = read_manifest()
+        manifest[key] = entry
+        path = os.path.join(SNAPSHOT_DIR, MANIFEST)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=4)
+        os.replace(path + '.tmp', path)
+
+
+def get_revision(client, spreadsheet):
+    """returns the last modified time of a spreadsheet (RFC 3339)"""
+    sh = client.open(spreadsheet)
+    return sh.updated
+
+
+def set_metadata(wks, key, value):
+    """set a developer metadata value of a worksheet, replacing it"""
+    existing = wks.get_developer_metadata(key)
+    if existing:
+        existing[0].value = value
+        existing[0].update()
+    else:
+        wks.create_developer_metadata(key, value)
+
+
+def stamp_worksheet(wks):
+    """Record a new revision of a worksheet's contents in its developer
+    metadata, call after every write to it (compile_hours does)."""
+    stamp = datetime.now(timezone.utc).isoformat()
+    set_metadata(wks, STAMP_KEY, stamp)
+    return stamp
+
+
+def get_fingerprint(wks):
+    """returns the revision stamp_worksheet last recorded for a worksheet,
+    None if it has none (e.g. it's only edited by hand), which never
+    matches so the worksheet is fetched whenever its spreadsheet changes"""
+    existing = wks.get_developer_metadata(STAMP_KEY)
+    return existing[0].value if existing else None
+
+
+def arrow_safe(df):
+    """cast columns holding mixed python types (e.g. numeric and text
+    comments) to strings so they can be written to parquet"""
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].dropna()
+        if values.map(type).nunique() > 1:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def save_snapshot(df, spreadsheet, sheet_title, revision, fingerprint):
+    """save a loaded worksheet to disk and record it in the manifest"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _snapshot_path(spreadsheet, sheet_title)
+    df.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+    _update_manifest(f'{spreadsheet}/{sheet_title}', {
+        'revision': revision,
+        'fingerprint': fingerprint,
+        'rows': len(df)
+    })
+
+
+def load_cached_report(client, spreadsheet, sheet_title, revision=None):
+    """Load data from sheet, served from a local snapshot when unchanged.
+    :param client: client object for accessing google
+    :param spreadsheet: spreadsheet name
+    :param sheet_title: sheet name
+    :param revision: spreadsheet revision from get_revision, fetched if None
+    :returns pandas dataframe
+    """
+    key = f'{spreadsheet}/{sheet_title}'
+    if revision is None:
+        with stage(f'revision {key}'):
+            revision = get_revision(client, spreadsheet)
+    entry = read_manifest().get(key)
+    path = _snapshot_path(spreadsheet, sheet_title)
+    has_snapshot = entry is not None and os.path.exists(path)
+
+    # spreadsheet untouched since the snapshot, no need to open it
+    if has_snapshot and entry['revision'] == revision:
+        print(f'{key} served from snapshot')
+        with stage(f'snapshot {key}'):
+            return pd.read_parquet(path)
+
+    with stage(f'fingerprint {key}'):
+        sh = client.open(spreadsheet)
+        wks = sh.worksheet_by_title(sheet_title)
+        fingerprint = get_fingerprint(wks)
+
+    # spreadsheet changed, but not this worksheet
+    if (has_snapshot and fingerprint is not None
+            and entry['fingerprint'] == fingerprint):
+        print(f'{key} unchanged, served from snapshot')
+        entry['revision'] = revision
+        _update_manifest(key, entry)
+        with stage(f'snapshot {key}'):
+            return pd.read_parquet(path)
+
+    print(f'{key} changed, fetching')
+    df = arrow_safe(read_worksheet(wks))
+    with stage(f'save snapshot {key}'):
+        save_snapshot(df, spreadsheet, sheet_title, revision, fingerprint)
+
+    return df
@@ -0,0 +1,168 @@
+"""where worksheets are read from and written to
+
+The app (components/loading.py) and the ETL (scripts/compile_hours.py) go
+through a storage backend instead of calling pygsheets directly. Both
+backends take the same (spreadsheet, sheet title) names and support column
+projection and row filters:
+
+- GoogleSheetsStorage, the production sheets. Reads are served from the
+  local snapshots (components/snapshots.py), columns and filters are applied
+  after loading.
+- ParquetStorage, a local directory with a parquet file per worksheet.
+  Columns and filters are pushed down to pyarrow, so only the requested
+  columns and row groups are read.
+
+Set STORAGE_DIR to run the app and the ETL against a local directory, e.g.
+one filled by `python -m scripts.export_storage`.
+
+Filters use the pyarrow form: a list of (column, op, value) tuples that all
+have to match, op one of ==, !=, <, <=, >, >=, in, not in.
+"""
+
+import os
+import threading
+import pandas as pd
+
+from components.snapshots import (get_revision, load_cached_report,
+                                  arrow_safe, stamp_worksheet)
+
+STORAGE_DIR = os.environ.get('STORAGE_DIR')
+
+_OPS = {
+    '==': lambda s, v: s == v,
+    '!=': lambda s, v: s != v,
+    '<': lambda s, v: s < v,
+    '<=': lambda s, v: s <= v,
+    '>': lambda s, v: s > v,
+    '>=': lambda s, v: s >= v,
+    'in': lambda s, v: s.isin(v),
+    'not in': lambda s, v: ~s.isin(v),
+}
+
+
+def select(df, columns=None, filters=None):
+    """returns the rows of df matching filters, with only columns"""
+    if filters:
+        filt = pd.Series(True, index=df.index)
+        for col, op, value in filters:
+            filt &= _OPS[op](df[col], value)
+        df = df.loc[filt]
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+class GoogleSheetsStorage:
+    """worksheets in google sheets"""
+
+    def __init__(self, client_factory, save=None, upsert=None):
+        """
+        :param client_factory: callable returning an authorized client
+        :param save: save(df, client, spreadsheet, sheet_title) replacing a
+            worksheet's contents, set_dataframe by default
+        :param upsert: upsert(df, client, spreadsheet, sheet_title,
+            date_col, start) returning False if it couldn't, not supported
+            by default
+        """
+        self.client_factory = client_factory
+        self._save = save
+        self._upsert = upsert
+        self._local = threading.local()
+
+    def client(self):
+        """this thread's client, the google api http object is not thread
+        safe, so each thread authorizes its own"""
+        if getattr(self._local, 'client', None) is None:
+            self._local.client = self.client_factory()
+        return self._local.client
+
+    def revision(self, spreadsheet):
+        """returns the last modified time of a spreadsheet"""
+        return get_revision(self.client(), spreadsheet)
+
+    def read(self, spreadsheet, sheet_title, columns=None, filters=None,
+             revision=None):
+        """Load a worksheet, served from a local snapshot when unchanged.
+        :param revision: spreadsheet revision from revision(), fetched if None
+        """
+        df = load_cached_report(self.client(), spreadsheet, sheet_title,
+                                revision)
+        return select(df, columns, filters)
+
+    def write(self, df, spreadsheet, sheet_title):
+        """replace a worksheet's contents with df"""
+        if self._save is not None:
+            return self._save(df, self.client(), spreadsheet, sheet_title)
+        wks = self.client().open(spreadsheet).worksheet_by_title(sheet_title)
+        wks.set_dataframe(df, 'A1', fit=True)
+        stamp_worksheet(wks)
+
+    def upsert(self, df, spreadsheet, sheet_title, date_col, start):
+        """Replace the rows dated start or later with df's.
+        :returns False if nothing was written, write the whole sheet instead
+        """
+        if self._upsert is None:
+            return False
+        return self._upsert(df, self.client(), spreadsheet, sheet_title,
+                            date_col, start)
+
+
+class ParquetStorage:
+    """worksheets as parquet files, root/spreadsheet/sheet_title.parquet"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, spreadsheet, sheet_title):
+        return os.path.join(self.root, spreadsheet, f'{sheet_title}.parquet')
+
+    def revision(self, spreadsheet):
+        """returns the latest modified time of a spreadsheet's files"""
+        folder = os.path.join(self.root, spreadsheet)
+        if not os.path.isdir(folder):
+            return ''
+        return str(max((entry.stat().st_mtime_ns
+                        for entry in os.scandir(folder)), default=0))
+
+    def read(self, spreadsheet, sheet_title, columns=None, filters=None,
+             revision=None):
+        """Load a worksheet, reading only columns and the rows matching
+        filters.
+        :param revision: unused, the files are always current
+        """
+        return pd.read_parquet(self.path(spreadsheet, sheet_title),
+                               columns=columns, filters=filters or None)
+
+    def write(self, df, spreadsheet, sheet_title):
+        """replace a worksheet's contents with df"""
+        path = self.path(spreadsheet, sheet_title)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # replace atomically so readers never see a partial file
+        arrow_safe(df.copy()).to_parquet(path + '.tmp', index=False)
+        os.replace(path + '.tmp', path)
+        print(f'{sheet_title} written to {path}')
+
+    def upsert(self, df, spreadsheet, sheet_title, date_col, start):
+        """Replace the rows dated start or later with df's.
+        :returns False if nothing was written, write the whole sheet instead
+        """
+        path = self.path(spreadsheet, sheet_title)
+        if not os.path.exists(path):
+            return False
+        kept = pd.read_parquet(path)
+        if not set(df.columns) <= set(kept.columns):
+            return False
+        kept = kept.loc[~(pd.to_datetime(kept[date_col]) >= start)]
+        self.write(pd.concat([kept, df.reindex(columns=kept.columns)],
+                             ignore_index=True),
+                   spreadsheet, sheet_title)
+        return True
+
+
+def get_storage(client_factory, **kwargs):
+    """the storage in STORAGE_DIR if set, google sheets otherwise
+    :param kwargs: passed to GoogleSheetsStorage
+    """
+    if STORAGE_DIR:
+        return ParquetStorage(STORAGE_DIR)
+    return GoogleSheetsStorage(client_factory, **kwargs)
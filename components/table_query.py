@@ -0,0 +1,153 @@
+"""server side filtering, sorting and paging for DataTables
+
+With page_action='custom' (and filter/sort 'custom') the table sends its
+filter_query, sort_by and page back to a callback instead of filtering the
+rows it holds, so a callback only has to send the visible page. These
+helpers translate them into vectorized pandas operations.
+"""
+
+import math
+import re
+import numpy as np
+import pandas as pd
+
+PAGE_SIZE = 50
+
+# "{Column Name} operator value", parts joined with " && "
+_FILTER_PART = re.compile(r'\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s*(?P<value>.*)')
+
+# DataTable prefixes operators with s (case sensitive, the default) or i
+# (case insensitive, the column's case toggle), the i forms map to i + op
+_OPERATORS = {
+    '=': 'eq', 'eq': 'eq',
+    '!=': 'ne', 'ne': 'ne',
+    '<': 'lt', 'lt': 'lt',
+    '<=': 'le', 'le': 'le',
+    '>': 'gt', 'gt': 'gt',
+    '>=': 'ge', 'ge': 'ge',
+    'contains': 'contains',
+}
+OPERATORS = {
+    **{key: op for key, op in _OPERATORS.items()},
+    **{'s' + key: op for key, op in _OPERATORS.items()},
+    **{'i' + key: 'i' + op for key, op in _OPERATORS.items()},
+    'datestartswith': 'datestartswith',
+}
+
+
+def split_filter_query(filter_query):
+    """returns a list of (column, operator, value) from a filter_query,
+    parts that can't be parsed are skipped"""
+    parts = []
+    for part in (filter_query or '').split(' && '):
+        match = _FILTER_PART.match(part.strip())
+        if not match or match['operator'] not in OPERATORS:
+            continue
+        value = match['value'].strip()
+        # quoted values may contain operators and escaped quotes
+        if len(value) > 1 and value[0] == value[-1] and value[0] in '"\'`':
+            value = value[1:-1].replace('\\' + value[0], value[0])
+        parts.append((match['column'], OPERATORS[match['operator']], value))
+    return parts
+
+
+def _coerce(s, value):
+    """returns value as the type of column s, or None if it can't be"""
+    try:
+        if pd.api.types.is_datetime64_any_dtype(s):
+            return pd.Timestamp(value)
+        if pd.api.types.is_numeric_dtype(s):
+            return float(value)
+    except ValueError:
+        return None
+    return value
+
+
+def _fold(s):
+    """returns s lower cased if it holds text, for the i operators"""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.rename_categories(
+            s.cat.categories.astype(str).str.lower())
+    if pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s):
+        return s.astype('string').str.lower()
+    return s
+
+
+def _contains(s, value, case=True):
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # search the labels once rather than every row
+        labels = s.cat.categories[
+            s.cat.categories.astype(str).str.contains(value, case=case,
+                                                      regex=False)]
+        return s.isin(labels)
+    return (s.astype('string').str.contains(value, case=case, regex=False)
+            .fillna(False))
+
+
+def filter_mask(df, filter_query):
+    """returns a boolean mask of the rows of df matching filter_query"""
+    mask = pd.Series(True, index=df.index)
+    for column, operator, value in split_filter_query(filter_query):
+        if column not in df.columns:
+            continue
+        s = df[column]
+        if operator in ('contains', 'icontains'):
+            mask &= _contains(s, value, case=operator == 'contains')
+        elif operator == 'datestartswith':
+            if pd.api.types.is_datetime64_any_dtype(s):
+                s = s.dt.strftime('%Y-%m-%d')
+            mask &= s.astype('string').str.startswith(value).fillna(False)
+        else:
+            if operator.startswith('i'):
+                operator = operator[1:]
+                s = _fold(s)
+                value = value.lower()
+            value = _coerce(s, value)
+            if value is None:
+                mask &= False
+                continue
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                s = s.astype(object)
+            mask &= getattr(s, operator)(value).fillna(False)
+    return mask
+
+
+def _sort_key(s):
+    # categories aren't in label order across concatenated partitions,
+    # rank the labels once and sort the rows by the rank of their label
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        ranks = s.cat.categories.astype(str).argsort().argsort()
+        codes = s.cat.codes.to_numpy()
+        return pd.Series(np.where(codes >= 0, ranks[codes], np.nan),
+                         index=s.index)
+    return s
+
+
+def sort_frame(df, sort_by):
+    """returns df sorted by a DataTable sort_by list, unchanged if empty"""
+    if not sort_by:
+        return df
+    return df.sort_values(
+        [col['column_id'] for col in sort_by],
+        ascending=[col['direction'] == 'asc' for col in sort_by],
+        kind='stable', key=_sort_key
+    )
+
+
+def query_table(df, filter_query, sort_by, page_current, page_size=PAGE_SIZE):
+    """returns the requested page of df
+    :param df: rows to show, in their default order
+    :param filter_query: DataTable filter_query
+    :param sort_by: DataTable sort_by
+    :param page_current: 0-indexed page
+    :param page_size: rows per page
+    :returns (page dataframe, page count, page), the page is moved back
+        if the filter left fewer pages
+    """
+    if filter_query:
+        df = df.loc[filter_mask(df, filter_query)]
+    df = sort_frame(df, sort_by)
+    page_count = max(1, math.ceil(len(df) / page_size))
+    page_current = min(page_current or 0, page_count - 1)
+    start = page_current * page_size
+    return df.iloc[start:start + page_size], page_count, page_current
@@ -7,6 +7,8 @@ from dateutil.relativedelta import relativedelta
 import numpy as np
 import plotly.graph_objects as go
 
+from components.boot import stage
+
 sem_months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 
               'Sep', 'Oct', 'Nov', 'Dec']
 # cutoff = 7
@@ -53,16 +55,17 @@ period_start = pd.to_datetime('2024-01-01')
 
 def auth_gspread():
     """Authorize Google to access the Utilization Project"""
-    # creds for local development
-    try:
-        client = pygsheets.authorize(
-            service_file='secrets/gs_credentials.json'
+    with stage('auth'):
+        # creds for local development
+        try:
+            client = pygsheets.authorize(
+                service_file='secrets/gs_credentials.json'
+                )
+        # creds for heroku deployment
+        except:
+            client = pygsheets.authorize(
+                service_account_env_var='GOOGLE_SHEETS_CREDS_JSON'
             )
-    # creds for heroku deployment
-    except:
-        client = pygsheets.authorize(
-            service_account_env_var='GOOGLE_SHEETS_CREDS_JSON'
-        )
         
     return client
 
@@ -77,89 +80,180 @@ def load_report(client, spreadsheet, sheet_title):
     # load data from google sheet
     sh = client.open(spreadsheet)
     wks = sh.worksheet_by_title(sheet_title)
-    data = wks.get_all_records(empty_value=None)  # get_as_df can't handle empty columns
-    df = pd.DataFrame(data)
-    df.dropna(axis=0, how='all', inplace=True)
     
-    return df
+    return read_worksheet(wks)
 
 
-def predict_utilization(idf, predict_input):
-    # calculated predicted values
-    max_DT = idf['DT'].max()
-    filt = idf['DT'] == max_DT
-    predicted_utilization = idf.loc[filt, 'Util to Date'].values[0]
-    predicted_fte = idf.loc[filt, 'FTE to Date'].values[0]
-    
-    # update with predicted input
-    if predict_input and predict_input > 0:
-        predicted_utilization = predict_input/100
-    
-    # create prediction space
-    max_month_index = sem_months.index(max_DT.strftime('%b')) + 1
-    prediction_months = sem_months[max_month_index:] 
-    prediction_years = [helper + idf['Entry Year'].max() 
-                        for helper in year_helper[max_month_index:]]
-    pdf = pd.DataFrame({'Entry Year': prediction_years, 
-                        'Entry Month': prediction_months})
-    pdf['DT'] = pd.to_datetime(pdf['Entry Year'].astype(str)
-                               + pdf['Entry Month'], 
-                               format='%Y%b')
-    pdf['MEH'] = pdf['DT'].apply(
-        lambda x: 8 * len(pd.bdate_range(x, x + pd.offsets.MonthEnd(0)))
-    )
-    # pdf['MEH'] = 8 * np.busday_count(
-    #     pdf['DT'].dt.date, pdf['DT'].dt.date + relativedelta(months=1)
-    #     )
-    
-    
-    # add predicted values 
-    if not pdf.empty:
-        pdf['Predicted Billable'] = pdf['MEH'] * predicted_utilization
-        pdf['Predicted Total'] = pdf['MEH'] * predicted_fte
-    else:
-        pdf['Predicted Billable'] = pd.Series([])
-        pdf['Predicted Total'] = pd.Series([])
+def read_worksheet(wks):
+    """Read an open worksheet (must be in tidy format) to a dataframe.
+    Empty rows are dropped.
+    :param wks: pygsheets worksheet
+    :returns pandas dataframe
+    """
+    with stage(f'fetch {wks.title}'):
+        data = wks.get_all_records(empty_value=None)  # get_as_df can't handle empty columns
+    with stage(f'parse {wks.title}'):
+        df = pd.DataFrame(data)
+        df.dropna(axis=0, how='all', inplace=True)
     
-    # add strategic year helper column
-    def strategy_year(row):  #TODO
-        if row['DT'].month < pd.to_datetime('Jan', format='%b').month:
-            return str(row['DT'].year - 1) + "-" + str(row['DT'].year)
-        else:
-            return str(row['DT'].year) + "-" + str(row['DT'].year + 1)
+    return df
+
+
+# prediction_components columns, besides those of predict_users
+COMPONENT_COLUMNS = ['Predicted', 'Default Utilization', 'Fixed Billable to Date',
+                     'Predicted MEH to Date', 'MEH to Date']
+
+
+def prediction_components(report):
+    """the parts of predict_users that don't depend on predict_input
     
-    pdf['Strategy Year'] = period_start.year  # idf.apply(strategy_year, axis=1) 
+    Billable hours are projected at the input rate from each user's last
+    month on (the Predicted rows), so a strategy year's running billable
+    total is the fixed billable hours before that plus rate x the predicted
+    MEH. Both running totals are kept, the rate is applied by
+    average_utilization.
+    :param report: hours report rows of one or more users
+    :returns predict_users(report, None) plus COMPONENT_COLUMNS
+    """
+    keys = report[['User Name', 'DT', 'Entry Year']].reset_index(drop=True)
+    users = keys.groupby('User Name', observed=True, sort=False)
+    # position of each user's last reported month, and each row's user
+    last = users['DT'].idxmax().to_numpy()
+    group = users.ngroup().to_numpy()
+    entry_year = users['Entry Year'].max().to_numpy()
+    is_last = (keys['DT'] == users['DT'].transform('max')).to_numpy()
 
-    # append to idf
-    idf = pd.concat([pdf, idf], ignore_index=True)
-    idf.fillna(0, inplace=True)
-    idf.sort_values('DT', inplace=True)
+    # calculated predicted values
+    predicted_utilization = report['Util to Date'].to_numpy()[last]
+    predicted_fte = report['FTE to Date'].to_numpy()[last]
+    
+    # create prediction space, the months after each user's last month
+    max_month = keys['DT'].to_numpy()[last].astype('datetime64[M]')
+    max_month_index = max_month.astype(int) % 12 + 1
+    n_months = len(sem_months) - max_month_index
+    user = np.repeat(np.arange(len(last)), n_months)
+    month_index = (np.repeat(max_month_index - np.cumsum(n_months) + n_months,
+                             n_months)
+                   + np.arange(len(user)))
+    prediction_years = entry_year[user] + np.asarray(year_helper)[month_index]
+    month = ((prediction_years - 1970) * 12 + month_index).astype('datetime64[M]')
+    meh = 8 * np.busday_count(month.astype('datetime64[D]'),
+                              (month + 1).astype('datetime64[D]'))
+    pdf = pd.DataFrame({
+        'Entry Year': prediction_years,
+        'Entry Month': np.asarray(sem_months, dtype=object)[month_index],
+        'DT': month.astype('datetime64[ns]'),
+        'MEH': meh,
+        # add predicted values 
+        'Predicted Billable': meh * predicted_utilization[user],
+        'Predicted Total': meh * predicted_fte[user],
+        'Strategy Year': period_start.year,
+        'User Name': keys['User Name'].iloc[last[user]].reset_index(drop=True),
+    })
+
+    # append to report, columns in the order of pdf then report
+    idf = pd.concat([pdf, report], ignore_index=True)
+    idf = idf[[col for col in pdf.columns if col != 'User Name']
+              + [col for col in report.columns
+                 if col not in pdf.columns or col == 'User Name']]
+    # categorical label columns can't take a 0, only fill the numbers
+    idf.fillna({col: 0 for col in idf.select_dtypes('number').columns},
+               inplace=True)
 
     # populate predicted columns
     idf['Predicted Billable'] = (idf['Predicted Billable'] + idf['Billable'])
     idf['Predicted Total'] = (idf['Predicted Total'] + idf['Total'])
     
-    # update predicted for this month
-    filt = idf['DT'] == max_DT
-    this_month_meh = idf.loc[filt, 'MEH'].values[0]
-    idf.loc[filt, 'Predicted Billable'] = predicted_utilization * this_month_meh
-    idf.loc[filt, 'Predicted Total'] = predicted_fte * this_month_meh
+    # update predicted for each user's last month
+    filt = np.concatenate([np.zeros(len(pdf), dtype=bool), is_last])
+    idf['Predicted'] = np.concatenate([np.ones(len(pdf), dtype=bool), is_last])
+    idf['Default Utilization'] = predicted_utilization[
+        np.concatenate([user, group])]
+    this_month_meh = idf.loc[filt, 'MEH'].to_numpy()
+    idf.loc[filt, 'Predicted Billable'] = (
+        predicted_utilization[group[is_last]] * this_month_meh)
+    idf.loc[filt, 'Predicted Total'] = predicted_fte[group[is_last]] * this_month_meh
+    idf.sort_values(['User Name', 'DT'], kind='stable', inplace=True)
+    
+    # calculate averages, running totals per user and strategy year
+    idf['Fixed Billable to Date'] = idf['Predicted Billable'].where(
+        ~idf['Predicted'], 0)
+    idf['Predicted MEH to Date'] = idf['MEH'].where(idf['Predicted'], 0)
+    sums = idf.groupby(['User Name', 'Strategy Year'], observed=True,
+                       sort=False)[['Fixed Billable to Date', 
+                                    'Predicted MEH to Date', 
+                                    'Predicted Total', 'MEH']].cumsum()
+    idf['Fixed Billable to Date'] = sums['Fixed Billable to Date']
+    idf['Predicted MEH to Date'] = sums['Predicted MEH to Date']
+    idf['MEH to Date'] = sums['MEH']
+    idf['Avg Utilization'] = average_utilization(idf, None)
+    idf['Avg FTE'] = sums['Predicted Total'] / sums['MEH']
     
-    # calculate averages
-    for sy in idf['Strategy Year'].unique():        
-        filt = idf['Strategy Year'] == sy
-        idf.loc[filt, 'Avg Utilization'] = (idf.loc[filt, 'Predicted Billable'].cumsum()
-                                    / idf.loc[filt, 'MEH'].cumsum())
-        idf.loc[filt, 'Avg FTE'] = (idf.loc[filt, 'Predicted Total'].cumsum()
-                                    / idf.loc[filt, 'MEH'].cumsum())
+    return idf
+
+
+def average_utilization(components, predict_input):
+    """returns the Avg Utilization of prediction_components at
+    predict_input, a few array operations
+    :param components: prediction_components frame, or a dict of its
+        columns as arrays
+    :param predict_input: utilization (%) to project with, each user's
+        utilization to date if not > 0
+    """
+    rate = components['Default Utilization']
+    if predict_input and predict_input > 0:
+        rate = predict_input/100
+    return ((components['Fixed Billable to Date']
+             + rate * components['Predicted MEH to Date'])
+            / components['MEH to Date'])
+
+
+def predict_users(report, predict_input):
+    """projects every user in report to the end of the year
+    :param report: hours report rows of one or more users
+    :param predict_input: utilization (%) to project with, each user's
+        utilization to date if not > 0
+    :returns report with each user's remaining months appended, Predicted
+        Billable/Total and Avg Utilization/FTE, sorted by user and DT
+    """
+    idf = prediction_components(report)
+    if predict_input and predict_input > 0:
+        idf['Predicted Billable'] = idf['Predicted Billable'].where(
+            ~idf['Predicted'], predict_input/100 * idf['MEH'])
+        idf['Avg Utilization'] = average_utilization(idf, predict_input)
+    return idf.drop(columns=COMPONENT_COLUMNS)
+
+
+def predict_utilization(idf, predict_input):
+    """predict_users for one user's rows, also returns their last reported
+    month"""
+    return predict_users(idf, predict_input), idf['DT'].max()
+
+
+### Daily rollup ###
+
+CUBE_DIMENSIONS = ['User Name', 'Project', 'Task Name', 'Classification', 
+                   'Hours Date']
+
+
+def build_daily_cube(entries):
+    """Sum entered hours by user, project, task, classification and day.
+    Keeps the entries' column names, so the totals below work on either.
+    """
+    cube = (
+        entries.groupby(CUBE_DIMENSIONS, observed=True, dropna=False)
+        ['Entered Hours']
+        .sum()
+        .reset_index()
+    )
     
-    return idf, max_DT
+    return cube
 
 
 ### Utilities for Projects ###
 
 def get_project_totals(idf):
-    project_totals = idf.groupby('Project')['Entered Hours'].sum()
+    project_totals = idf.groupby('Project', observed=True)['Entered Hours'].sum()
     project_totals.sort_values(inplace=True)
     
     return project_totals
@@ -168,7 +262,7 @@ def get_project_totals(idf):
 def get_task_totals(idf, project):
     filt = idf['Project'] == project
     entries_by_date = idf.loc[filt, :]
-    task_totals = entries_by_date.groupby('Task Name')['Entered Hours'].sum()
+    task_totals = entries_by_date.groupby('Task Name', observed=True)['Entered Hours'].sum()
     task_totals.sort_values(inplace=True)
     
     return task_totals
@@ -185,7 +279,7 @@ def get_meh_from_entries(idf):
 ### Utilities for Teams ###
 
 def get_user_totals(pdf):
-    user_totals = pdf.groupby('User Name')['Entered Hours'].sum()
+    user_totals = pdf.groupby('User Name', observed=True)['Entered Hours'].sum()
     user_totals.sort_values(inplace=True)
     
     return user_totals
@@ -194,7 +288,7 @@ def get_user_totals(pdf):
 def get_user_task_totals(pdf, user):
     filt = pdf['User Name'] == user
     entries_by_date = pdf.loc[filt, :]
-    user_totals = entries_by_date.groupby('Task Name')['Entered Hours'].sum()
+    user_totals = entries_by_date.groupby('Task Name', observed=True)['Entered Hours'].sum()
     user_totals.sort_values(inplace=True)
     
     return user_totals
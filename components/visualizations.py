@@ -1,5 +1,6 @@
 """functions for plotting in the utilization report"""
 
+import json
 import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
@@ -19,7 +20,17 @@ def plot_utilization(df, name, predict_input):
     # subset df and entries by user
     idf = df[df['User Name'] == name].copy()
     idf, max_DT = utils.predict_utilization(idf, predict_input)
-        
+    return plot_prediction(idf, max_DT)
+
+
+def _predicted_text(predict_display):
+    return f'Predicted<br>Utilization ({predict_display*100:.0f}%)'
+
+
+def plot_prediction(idf, max_DT):
+    """utilization chart of one user's predict_utilization rows
+    :param max_DT: last reported month
+    """
     # create figure
     fig = go.Figure()
     
@@ -168,7 +179,7 @@ def plot_utilization(df, name, predict_input):
     predicted = idf.loc[filt, 'Avg Utilization']
     if not predicted.empty:
         predict_display = predicted.values[0]
-        predict_text = f'Predicted<br>Utilization ({predict_display*100:.0f}%)'
+        predict_text = _predicted_text(predict_display)
         fig.add_annotation(x=period_end.replace(day=1),
                         y=predict_display,
                         text=predict_text,
@@ -199,14 +210,42 @@ def plot_utilization(df, name, predict_input):
     return fig
 
 
-def plot_projects(df, name, start_date, end_date, mode, project=None):
-    # subset df and entries by user
-    idf = df[df['User Name'] == name].copy()
-    filt = (idf['Hours Date'] >= start_date) & (idf['Hours Date'] <= end_date) 
-    entries_by_date = idf.loc[filt, :]
+def prediction_patch(fig, idf):
+    """returns where the utilization input shows in a plot_prediction
+    figure: (trace index, idf row positions) of each Average Utilization
+    trace, and the row position of the predicted annotation (if any)"""
+    strategy_years = idf['Strategy Year'].to_numpy()
+    traces = [i for i, trace in enumerate(fig.data)
+              if trace.name == 'Average Utilization']
+    lines = [(i, np.flatnonzero(strategy_years == sy))
+             for i, sy in zip(traces, idf['Strategy Year'].unique())]
+    annotation = np.flatnonzero(idf['DT'] == period_end.replace(day=1))
+    return lines, annotation[:1]
+
+
+def set_predicted_utilization(fig, components, patch, predict_input):
+    """redraw the input dependent parts of a plot_prediction figure dict,
+    or set them on a dash.Patch of one
+    :param components: the user's utils.prediction_components, as arrays
+    :param patch: prediction_patch of the figure
+    """
+    avg = np.asarray(utils.average_utilization(components, predict_input))
+    lines, annotation = patch
+    for i, positions in lines:
+        fig['data'][i]['y'] = avg[positions].tolist()
+    for position in annotation:
+        predict_display = float(avg[position])
+        fig['layout']['annotations'][0].update(
+            y=predict_display, text=_predicted_text(predict_display))
+    return fig
+
+
+def plot_projects(entries_by_date, mode, project=None, meh=None):
+    # entries_by_date is one user's entries in the date range
     if entries_by_date.empty:
         return utils.no_matching_data()
-    meh = utils.get_meh_from_entries(entries_by_date)
+    if meh is None:
+        meh = utils.get_meh_from_entries(entries_by_date)
     bar_width = .7
     fig = go.Figure()
 
@@ -281,11 +320,40 @@ def plot_projects(df, name, start_date, end_date, mode, project=None):
     return fig
 
 
-def plot_team(df, project, start_date, end_date, mode, user=None):
-    # subset df and entries by user
-    pdf = df[df['Project'] == project].copy()
-    filt = (pdf['Hours Date'] >= start_date) & (pdf['Hours Date'] <= end_date)
-    entries_by_date = pdf.loc[filt, :]
+def drilldown_totals(entries_by_date, key, labels):
+    """returns the task totals of each label of column key (a bar of the
+    top level chart), smallest first like get_task_totals, as
+    {label: {'tasks': [...], 'hours': [...]}}. Labels without entries get
+    no tasks.
+    """
+    totals = entries_by_date.groupby([key, 'Task Name'],
+                                     observed=True)['Entered Hours'].sum()
+    labelled = set(totals.index.get_level_values(0))
+    drilldown = {}
+    for label in labels:
+        tasks = (totals.xs(label).sort_values() if label in labelled
+                 else pd.Series(dtype=float))
+        drilldown[label] = {'tasks': list(tasks.index),
+                            'hours': [float(h) for h in tasks]}
+    return drilldown
+
+
+def drilldown_figures(top, drilldown, meh=None, empty=False):
+    """returns the top level figure and the task totals behind each of its
+    bars, for the browser to draw a bar's drill-down chart on a click
+    (render_chart in assets/clientside.js, drawn like plot_projects and
+    plot_team's Tasks mode)
+    :param top: figure
+    :param drilldown: drilldown_totals
+    :param meh: hours the bars are a share of, None for no share annotations
+    :param empty: no entries, every drill-down shows the top figure
+    """
+    return {'top': json.loads(top.to_json()), 'drilldown': drilldown,
+            'meh': meh, 'empty': empty}
+
+
+def plot_team(entries_by_date, mode, user=None):
+    # entries_by_date is one project's entries in the date range
     if entries_by_date.empty:
         return utils.no_matching_data()
     bar_width = .7
@@ -0,0 +1,31 @@
+"""gunicorn settings, read automatically by `gunicorn index:server`
+
+With SHARED_DATA_DIR set a publisher process started by the master loads
+the data once and publishes it as memory-mapped Arrow files for the workers
+(see components/shared.py), then republishes whenever the upstream sheets
+change.
+"""
+
+import os
+import multiprocessing
+
+SHARED_DATA_DIR = os.environ.get('SHARED_DATA_DIR')
+
+
+def when_ready(server):
+    # runs in the master before the workers are forked
+    if not SHARED_DATA_DIR:
+        return
+    from components.shared import run_publisher
+
+    # spawned, not forked, so it shares no threads or locks with the master
+    context = multiprocessing.get_context('spawn')
+    ready = context.Event()
+    publisher = context.Process(target=run_publisher,
+                                args=(SHARED_DATA_DIR, ready),
+                                name='data-publisher', daemon=True)
+    publisher.start()
+    # workers map the first version when they boot
+    while not ready.wait(1):
+        if not publisher.is_alive():
+            raise RuntimeError('data publisher exited before publishing')
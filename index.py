@@ -2,8 +2,12 @@ from dash import dcc
 from dash import html
 from dash.dependencies import Input, Output
 # see https://community.plot.ly/t/nolayoutexception-on-deployment-of-multi-page-dash-app-example-code/12463/2?u=dcomfort
-from app import app, server
-from apps import utilization, projects, team, forecasts
+from components.boot import boot_report, stage
+with stage('app'):
+    from app import app, server
+# loads the data through apps.data
+with stage('pages'):
+    from apps import utilization, projects, team, forecasts
 from apps.navbar import navbar
 
 # from layouts import layout_main, projects_layout, allocation_layout
@@ -66,5 +70,8 @@ def display_page(pathname):
         return '404'
 
 
+# everything is loaded once this module is imported
+boot_report.emit()
+
 if __name__ == '__main__':
     app.run_server(debug=False)  # SWITCH FOR DEV
\ No newline at end of file
@@ -0,0 +1,29 @@
+"""write the <year>-labels worksheet of every year that doesn't have one yet
+
+compile_hours only writes the current year's labels. The app reads every
+year's at boot to fill the name and project dropdowns, a year without one
+only offers its names once its history is loaded. Run once after adding a
+year to components/loading.py's years, from the repo root:
+
+    python -m scripts.backfill_labels
+"""
+
+from components.loading import years, LABEL_COLUMNS
+from components.storage import get_storage
+from components.utils import auth_gspread
+from scripts.compile_hours import get_labels, save_to_gs, hours_entries_sh
+
+
+if __name__ == '__main__':
+    storage = get_storage(auth_gspread, save=save_to_gs)
+    for year in years:
+        try:
+            storage.read(hours_entries_sh, f'{year}-labels')
+            print(f'{year}-labels exists')
+            continue
+        except Exception:
+            pass
+        hours_entries = storage.read(hours_entries_sh, f'{year}-hours',
+                                     columns=LABEL_COLUMNS)
+        storage.write(get_labels(hours_entries), hours_entries_sh,
+                      f'{year}-labels')
@@ -0,0 +1,89 @@
+"""times compile_hours.stream_sheet against read_excel then dropna on the
+Hours Entries sheet, and the peak memory each allocates while parsing
+
+run from the repo root: python -m scripts.benchmark_ingest [workbook | n rows]
+without a workbook, a synthetic export of n rows (default 20000) is written
+to a temporary file
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import openpyxl
+
+from scripts import compile_hours
+
+
+def make_export(path, n_rows, seed=0):
+    """write an Hours Entries sheet shaped like Deltek's, with an empty
+    comment row after every tenth entry"""
+    rng = np.random.default_rng(seed)
+    entries = pd.DataFrame({
+        'Employee ID': rng.integers(100001, 100200, n_rows),
+        'Last Name': [f'Last{i}' for i in rng.integers(0, 200, n_rows)],
+        'First Name': ' First',
+        'Hours Date': pd.Timestamp('2021-01-01')
+                      + pd.to_timedelta(rng.integers(0, 365, n_rows), 'D'),
+        'Project ID': [f'{p}.{t:03d}.01' for p, t in
+                       zip(rng.integers(1000, 9999, n_rows),
+                           rng.integers(1, 20, n_rows))],
+        'Project Name': [f'Task {i}' for i in rng.integers(0, 300, n_rows)],
+        'Entered Hours': rng.choice([0.5, 1, 2, 4, 8], n_rows),
+        'Comments': [f'comment {i}' for i in range(n_rows)],
+    })
+    blank = np.arange(0, n_rows, 10) + 0.5
+    empty = pd.DataFrame(index=blank, columns=entries.columns)
+    export = pd.concat([entries, empty]).sort_index()
+    with pd.ExcelWriter(path) as writer:
+        export.to_excel(writer, sheet_name=compile_hours.hours_entries_sheet,
+                        index=False)
+
+
+def read_excel(path):
+    return pd.read_excel(path, compile_hours.hours_entries_sheet,
+                         engine='openpyxl').dropna(how='all')
+
+
+def stream(path):
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    sheet = compile_hours.hours_entries_sheet
+    df = compile_hours.stream_sheet(wb[sheet],
+                                    compile_hours.streamed_sheets[sheet])
+    wb.close()
+    return df
+
+
+def measure(func, path):
+    """returns (seconds, peak MB allocated, result)"""
+    start = time.perf_counter()
+    func(path)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    df = func(path)
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return seconds, peak, df
+
+
+if __name__ == '__main__':
+    arg = sys.argv[1] if len(sys.argv) > 1 else '20000'
+    if os.path.exists(arg):
+        path = arg
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'hours.xlsx')
+        make_export(path, int(arg))
+
+    old_s, old_mb, old = measure(read_excel, path)
+    new_s, new_mb, new = measure(stream, path)
+
+    # same entries, stream_sheet keeps text as text
+    pd.testing.assert_frame_equal(old.reset_index(drop=True), new,
+                                  check_dtype=False)
+
+    print(f'{len(new)} entries')
+    print(f'read_excel:   {old_s:.2f}s, peak {old_mb:.0f} MB')
+    print(f'stream_sheet: {new_s:.2f}s, peak {new_mb:.0f} MB')
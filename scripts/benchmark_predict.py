@@ -0,0 +1,111 @@
+"""times utils.predict_users against the row-wise predict_utilization it
+replaced, on a synthetic hours report
+
+run from the repo root: python -m scripts.benchmark_predict [n users]
+"""
+
+import sys
+import timeit
+import numpy as np
+import pandas as pd
+
+from components import utils
+
+
+def make_report(n_users, start='2022-01-01', end='2024-09-01', seed=0):
+    """returns an hours report shaped like the app's, n_users x months"""
+    rng = np.random.default_rng(seed)
+    months = pd.date_range(start, end, freq='MS')
+    dt = np.tile(months.values, n_users)
+    meh = 8 * np.busday_count(dt.astype('datetime64[D]'),
+                              (dt.astype('datetime64[M]') + 1).astype('datetime64[D]'))
+    total = meh * rng.uniform(0.8, 1.0, len(dt))
+    billable = total * rng.uniform(0.2, 0.8, len(dt))
+    report = pd.DataFrame({
+        'Entry Year': pd.DatetimeIndex(dt).year.astype('int16'),
+        'Entry Month': pd.Categorical(pd.DatetimeIndex(dt).strftime('%b')),
+        'Billable': billable.astype('float32'),
+        'Total': total.astype('float32'),
+        'DT': dt,
+        'MEH': meh.astype('float32'),
+        'User Name': pd.Categorical(np.repeat([f'User {i}' for i in range(n_users)],
+                                              len(months))),
+    })
+    years = report['DT'].dt.year - (report['DT'].dt.month < 4)
+    report['Strategy Year'] = years.astype(str) + '-' + (years + 1).astype(str)
+    sums = report.groupby(['User Name', 'Strategy Year'], observed=True)[
+        ['Billable', 'Total', 'MEH']].cumsum()
+    report['Util to Date'] = (sums['Billable'] / sums['MEH']).astype('float32')
+    report['FTE to Date'] = (sums['Total'] / sums['MEH']).astype('float32')
+    return report
+
+
+def predict_utilization_rowwise(idf, predict_input):
+    """the per-user predict_utilization before predict_users, for comparison"""
+    max_DT = idf['DT'].max()
+    filt = idf['DT'] == max_DT
+    predicted_utilization = idf.loc[filt, 'Util to Date'].values[0]
+    predicted_fte = idf.loc[filt, 'FTE to Date'].values[0]
+    if predict_input and predict_input > 0:
+        predicted_utilization = predict_input/100
+    max_month_index = utils.sem_months.index(max_DT.strftime('%b')) + 1
+    prediction_months = utils.sem_months[max_month_index:]
+    prediction_years = [helper + idf['Entry Year'].max()
+                        for helper in utils.year_helper[max_month_index:]]
+    pdf = pd.DataFrame({'Entry Year': prediction_years,
+                        'Entry Month': prediction_months})
+    pdf['DT'] = pd.to_datetime(pdf['Entry Year'].astype(str)
+                               + pdf['Entry Month'],
+                               format='%Y%b')
+    pdf['MEH'] = pdf['DT'].apply(
+        lambda x: 8 * len(pd.bdate_range(x, x + pd.offsets.MonthEnd(0)))
+    )
+    pdf['Predicted Billable'] = pdf['MEH'] * predicted_utilization
+    pdf['Predicted Total'] = pdf['MEH'] * predicted_fte
+    pdf['Strategy Year'] = utils.period_start.year
+    idf = pd.concat([pdf, idf], ignore_index=True)
+    idf.fillna({col: 0 for col in idf.select_dtypes('number').columns},
+               inplace=True)
+    idf.sort_values('DT', inplace=True)
+    idf['Predicted Billable'] = (idf['Predicted Billable'] + idf['Billable'])
+    idf['Predicted Total'] = (idf['Predicted Total'] + idf['Total'])
+    filt = idf['DT'] == max_DT
+    this_month_meh = idf.loc[filt, 'MEH'].values[0]
+    idf.loc[filt, 'Predicted Billable'] = predicted_utilization * this_month_meh
+    idf.loc[filt, 'Predicted Total'] = predicted_fte * this_month_meh
+    for sy in idf['Strategy Year'].unique():
+        filt = idf['Strategy Year'] == sy
+        idf.loc[filt, 'Avg Utilization'] = (idf.loc[filt, 'Predicted Billable'].cumsum()
+                                    / idf.loc[filt, 'MEH'].cumsum())
+        idf.loc[filt, 'Avg FTE'] = (idf.loc[filt, 'Predicted Total'].cumsum()
+                                    / idf.loc[filt, 'MEH'].cumsum())
+    return idf, max_DT
+
+
+def ms_per_call(func, number):
+    return round(min(timeit.repeat(func, number=number, repeat=5))
+                 / number * 1000, 2)
+
+
+if __name__ == '__main__':
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    report = make_report(n_users)
+    name = report['User Name'].iloc[0]
+    one = report[report['User Name'] == name].copy()
+
+    # same values, predict_users also names the predicted rows
+    old, old_DT = predict_utilization_rowwise(one.copy(), 60)
+    new, new_DT = utils.predict_utilization(one.copy(), 60)
+    old['User Name'] = new['User Name']
+    assert old_DT == new_DT
+    pd.testing.assert_frame_equal(old, new, check_exact=False, rtol=1e-12)
+
+    def rowwise_all():
+        for user in report['User Name'].cat.categories:
+            predict_utilization_rowwise(
+                report[report['User Name'] == user].copy(), 60)
+
+    print(f'one user:   row-wise {ms_per_call(lambda: predict_utilization_rowwise(one.copy(), 60), 20)} ms, '
+          f'vectorized {ms_per_call(lambda: utils.predict_utilization(one.copy(), 60), 20)} ms')
+    print(f'{n_users} users: row-wise {ms_per_call(rowwise_all, 1)} ms, '
+          f'vectorized {ms_per_call(lambda: utils.predict_users(report, 60), 1)} ms')
@@ -5,6 +5,17 @@ from datetime import datetime as dt
 import os
 import sys
 import json
+import hashlib
+import time
+import random
+import threading
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+import openpyxl
+from googleapiclient.errors import HttpError
+
+from components.storage import get_storage
+from components.snapshots import stamp_worksheet, set_metadata
 
 
 ### FILE LOCATIONS ###
@@ -38,9 +49,31 @@ all_tables_wks = 'all-tables'
 years = [2019, 2020, 2021]
 hours_sheets = [str(year) + "-hours" for year in years]
 table_sheets = [str(year) + "-table" for year in years]
+# user names, projects and task names of a year, read by the app's dropdowns
+labels_sheets = [str(year) + "-labels" for year in years]
 
 current_hours_wks = hours_sheets[-1]
 current_table_wks = table_sheets[-1]
+current_labels_wks = labels_sheets[-1]
+
+# last run's inputs and latest hours date, for --incremental runs
+watermark_file = 'data/hours_watermark.json'
+
+# sheets streamed row by row instead of parsed with read_excel, with the
+# types of their columns ('datetime' or 'float', the rest are inferred)
+streamed_sheets = {
+    hours_entries_sheet: {'Hours Date': 'datetime', 'Entered Hours': 'float'},
+}
+# rows held as python objects at a time while streaming
+stream_chunk_rows = 10000
+
+# uploads are split into chunks of rows under the API's recommended 2 MB
+# request, sent upload_workers at a time and retried upload_retries times
+upload_chunk_bytes = 1500000
+upload_workers = 4
+upload_retries = 5
+# developer metadata of a staging worksheet identifying the frame uploaded
+upload_frame_key = 'upload-frame'
 
 ### FUNCTIONS ###
 
@@ -78,23 +111,6 @@ def auth_gspread():
     return client
 
 
-def load_report(client, spreadsheet, sheet_title):
-    """Load data (must be in tidy format) from sheet.
-    Empty rows are dropped.
-    :param client: client object for accessing google
-    :param sheet: 0-indexed sheet number or sheet name
-    :returns pandas dataframe
-    """
-    # load data from google sheet
-    sh = client.open(spreadsheet)
-    wks = sh.worksheet_by_title(sheet_title)
-    data = wks.get_all_records(empty_value=None)  # get_as_df can't handle empty columns
-    df = pd.DataFrame(data)
-    df.dropna(axis=0, how='all', inplace=True)
-    
-    return df
-
-
 def process_work_schedule(row):
     if pd.isnull(row['Work Schedule']):
         return np.nan
@@ -116,12 +132,345 @@ def first_last_to_username(df):
     return df
 
 
-def save_to_gs(df, client, worksheet, sheet_name):
+def stream_sheet(ws, types=None, chunk_rows=stream_chunk_rows):
+    """Read a worksheet of a read-only workbook into a dataframe, a row at a
+    time. Empty rows (Deltek adds them for long comments) are skipped as
+    they're read, and every chunk_rows rows are converted to typed column
+    arrays, so memory beyond the frame itself doesn't grow with the sheet.
+    Same frame as read_excel then dropna(how='all') except that cells
+    are kept as stored: text isn't parsed as numbers or nan (e.g. a Project
+    ID of '1000.001' stays text), integer columns stay integers without the
+    empty rows, and the index is a plain range.
+    :param types: column name to 'datetime' or 'float', other columns are
+        inferred like read_excel does
+    """
+    rows = ws.iter_rows(values_only=True)
+    header = list(next(rows, ()))
+    while header and header[-1] is None:
+        header.pop()
+    columns = [f'Unnamed: {i}' if name is None else name
+               for i, name in enumerate(header)]
+    types = types or {}
+    dtypes = [{'datetime': 'datetime64[ns]', 'float': 'float64'}
+              .get(types.get(col), object) for col in columns]
+    width = len(columns)
+    arrays = [[] for _ in columns]
+    chunk = []
+
+    def flush():
+        for values, dtype, col_arrays in zip(zip(*chunk), dtypes, arrays):
+            if dtype is object:
+                values = [np.nan if value is None else value
+                          for value in values]
+            col_arrays.append(np.array(values, dtype=dtype))
+        chunk.clear()
+
+    for row in rows:
+        if all(value is None for value in row):
+            continue
+        chunk.append(row[:width] + (None,) * (width - len(row)))
+        if len(chunk) == chunk_rows:
+            flush()
+    if chunk:
+        flush()
+
+    df = pd.DataFrame({
+        col: (np.concatenate(col_arrays) if col_arrays
+              else np.array([], dtype=dtype))
+        for col, dtype, col_arrays in zip(columns, dtypes, arrays)
+    })
+    return df.infer_objects()
+
+
+def parse_sheets(path, sheets):
+    """Parse sheets of one workbook, opening it once. Sheets in
+    streamed_sheets are streamed, the rest parsed with read_excel.
+    :returns (seconds to open, dict of sheet name to (dataframe, seconds
+        to parse))
+    """
+    start = time.perf_counter()
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    with pd.ExcelFile(wb, engine='openpyxl') as xls:
+        opened = time.perf_counter() - start
+        parsed = {}
+        for sheet in sheets:
+            start = time.perf_counter()
+            if sheet in streamed_sheets:
+                df = stream_sheet(wb[sheet], streamed_sheets[sheet])
+            else:
+                df = xls.parse(sheet)
+            parsed[sheet] = (df, time.perf_counter() - start)
+    return opened, parsed
+
+
+def read_workbooks(sheet_groups):
+    """Parse groups of sheets in parallel, one process per group, and print
+    how long each workbook took to open and each sheet to parse.
+    :param sheet_groups: list of (workbook path, sheet names), each group's
+        workbook is opened once
+    :returns dict of sheet name to dataframe
+    """
+    frames = {}
+    with ProcessPoolExecutor(max_workers=len(sheet_groups)) as pool:
+        futures = [(path, pool.submit(parse_sheets, path, sheets))
+                   for path, sheets in sheet_groups]
+        for path, future in futures:
+            opened, parsed = future.result()
+            print(f'{os.path.basename(path)} opened in {opened:.1f}s')
+            for sheet, (df, seconds) in parsed.items():
+                print(f'    {sheet}: {len(df)} rows parsed in {seconds:.1f}s')
+                frames[sheet] = df
+    return frames
+
+
+def sheet_values(df):
+    """df as strings, the way set_dataframe writes it"""
+    return df.fillna('NaN').astype('unicode')
+
+
+def split_rows(sizes, max_bytes=upload_chunk_bytes):
+    """Split rows into chunks of about max_bytes at most (over by less than
+    a row) given the size of each row.
+    :returns list of (first row, last row + 1)
+    """
+    if not len(sizes):
+        return []
+    offsets = np.cumsum(sizes) - sizes
+    edges = np.flatnonzero(np.diff(offsets // max_bytes)) + 1
+    edges = [0] + edges.tolist() + [len(sizes)]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def with_backoff(func, retries=upload_retries):
+    """Call func, retrying on quota, server and connection errors after
+    1s, 2s, 4s... (plus jitter)"""
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except (HttpError, OSError) as error:
+            retry = (not isinstance(error, HttpError)
+                     or error.resp.status in (429, 500, 502, 503, 504))
+            if not retry or attempt == retries:
+                raise
+            wait = 2 ** attempt + random.random()
+            print(f'    {error.__class__.__name__}, retrying in {wait:.1f}s')
+            time.sleep(wait)
+
+
+def swap_in(sh, staging, sheet_name):
+    """Replace worksheet sheet_name (if it exists) with staging, in its
+    place, in one batch update, which the api applies all or nothing."""
+    requests = []
+    index = staging.index
+    try:
+        old = sh.worksheet_by_title(sheet_name)
+        requests.append({'deleteSheet': {'sheetId': old.id}})
+        index = old.index
+    except pygsheets.WorksheetNotFound:
+        pass
+    requests.append({'updateSheetProperties': {
+        'properties': {'sheetId': staging.id, 'title': sheet_name,
+                       'index': index},
+        'fields': 'title,index'}})
+    sh.custom_request(requests, fields='replies')
+
+
+def frame_stamp(values):
+    """row count and hash of a frame's values, to check a resumed upload
+    continues the same frame"""
+    hashes = pd.util.hash_pandas_object(values, index=False).to_numpy()
+    sha = hashlib.sha1(hashes.tobytes())
+    sha.update('|'.join(map(str, values.columns)).encode())
+    return f'{len(values)}:{sha.hexdigest()}'
+
+
+def save_to_gs(df, client, worksheet, sheet_name, start_chunk=0):
+    """Replace a worksheet's contents with df, like set_dataframe with
+    fit=True. Rows are written to a staging worksheet, in chunks of up to
+    upload_chunk_bytes, upload_workers at a time, each retried with backoff,
+    and the staging worksheet replaces sheet_name once they're all in, so
+    readers never see a half written sheet. If a chunk still fails, the
+    error says which chunk to pass as start_chunk to resume from, the
+    chunks before it are in the staging worksheet. Resuming refuses a
+    staging worksheet filled from a different frame.
+    """
+    start = time.perf_counter()
+    values = sheet_values(df)
+    # cell text plus quotes and a comma per cell
+    sizes = (values.apply(lambda col: col.str.len()).sum(axis=1).to_numpy()
+             + 3 * len(df.columns))
+    chunks = split_rows(sizes)
+
+    sh = client.open(worksheet)
+    staging_name = f'{sheet_name}-staging'
+
+    def staging_sheet():
+        # looked up again on a retry, an add that timed out may have
+        # gone through
+        try:
+            return sh.worksheet_by_title(staging_name)
+        except pygsheets.WorksheetNotFound:
+            return sh.add_worksheet(staging_name, rows=len(df) + 1,
+                                    cols=len(df.columns))
+
+    staging = with_backoff(staging_sheet)
+    stamp = frame_stamp(values)
+    if start_chunk == 0:
+        with_backoff(lambda: staging.resize(rows=len(df) + 1,
+                                            cols=len(df.columns)))
+        with_backoff(lambda: staging.update_values(
+            'A1', [df.columns.tolist()]))
+        with_backoff(lambda: set_metadata(staging, upload_frame_key, stamp))
+    else:
+        # the chunks already sent have to be rows of the same frame
+        recorded = with_backoff(
+            lambda: staging.get_developer_metadata(upload_frame_key))
+        if not recorded or recorded[0].value != stamp:
+            raise RuntimeError(
+                f'{staging_name} was filled from a different frame, '
+                f'upload it again with start_chunk=0')
+
+    # the http connection isn't thread safe, each thread opens the
+    # worksheet with a client of its own
+    local = threading.local()
+
+    def send(first, last):
+        if not hasattr(local, 'wks'):
+            thread_client = pygsheets.authorize(custom_credentials=client.oauth)
+            local.wks = (thread_client.open(worksheet)
+                         .worksheet_by_title(staging_name))
+        rows = values.iloc[first:last].values.tolist()
+        with_backoff(lambda: local.wks.update_values(f'A{first + 2}', rows))
+
+    with ThreadPoolExecutor(max_workers=upload_workers) as pool:
+        futures = {pool.submit(send, *chunks[i]): i
+                   for i in range(start_chunk, len(chunks))}
+        failed = None
+        for future in as_completed(futures):
+            if future.exception() is not None:
+                failed = future.exception()
+                for pending in futures:
+                    pending.cancel()
+                break
+    if failed is not None:
+        # the running chunks have finished, resume from the first not sent
+        resume = min(i for future, i in futures.items()
+                     if future.cancelled() or future.exception() is not None)
+        raise RuntimeError(
+            f'{sheet_name} upload failed at chunk {resume} of '
+            f'{len(chunks)}, {sheet_name} is unchanged, resume with '
+            f'save_to_gs(..., start_chunk={resume})') from failed
+    # new contents, the app's snapshots of the worksheet are stale
+    with_backoff(lambda: stamp_worksheet(staging))
+    with_backoff(lambda: swap_in(sh, staging, sheet_name))
+
+    rows = len(df) - chunks[start_chunk][0] if start_chunk < len(chunks) else 0
+    seconds = time.perf_counter() - start
+    print(f'{sheet_name} uploaded to {worksheet}: {rows} rows in '
+          f'{len(chunks) - start_chunk} chunks, {seconds:.1f}s '
+          f'({rows / seconds:.0f} rows/s)')
+
+
+def upsert_to_gs(df, client, worksheet, sheet_name, date_col, start):
+    """Replace the rows of a worksheet dated start or later with df's,
+    leaving the earlier rows in place. Stale rows are deleted in one batch
+    request and the new ones appended after the rest.
+    :param df: rows dated start or later
+    :param date_col: column the rows are dated by
+    :param start: first date replaced
+    :returns False (nothing written) if df has columns the worksheet doesn't
+    """
     sh = client.open(worksheet)
     wks = sh.worksheet_by_title(sheet_name)
-    wks.set_dataframe(df, 'A1', fit = True)
-    print (f'{sheet_name} uploaded to {worksheet}')
-    
+    header = wks.get_row(1, include_tailing_empty=False)
+    if not set(df.columns) <= set(header):
+        return False
+    df = df.reindex(columns=header)
+
+    # worksheet rows (0-indexed, the header is row 0) to replace
+    dates = wks.get_col(header.index(date_col) + 1,
+                        include_tailing_empty=False)[1:]
+    dates = pd.to_datetime(pd.Series(dates, dtype=object), format='mixed',
+                           errors='coerce')
+    stale = np.flatnonzero(dates >= start) + 1
+
+    # delete runs of consecutive rows, bottom up so indexes stay valid
+    runs = np.split(stale, np.flatnonzero(np.diff(stale) != 1) + 1)
+    requests = [
+        {'deleteDimension': {'range': {
+            'sheetId': wks.id, 'dimension': 'ROWS',
+            'startIndex': int(run[0]), 'endIndex': int(run[-1]) + 1}}}
+        for run in reversed(runs) if len(run)
+    ]
+    if requests:
+        sh.custom_request(requests, fields='replies')
+    if not df.empty:
+        values = sheet_values(df).values.tolist()
+        wks.append_table(values, start='A1', dimension='ROWS')
+    stamp_worksheet(wks)
+    print(f'{sheet_name}: replaced {len(stale)} rows from '
+          f'{start:%Y-%m-%d} with {len(df)}')
+    return True
+
+
+def get_labels(hours_entries):
+    """the distinct user name, project and task name rows of the hours
+    entries, a small sheet the app reads for every year at boot"""
+    return (hours_entries[['User Name', 'Project', 'Task Name']]
+            .drop_duplicates().reset_index(drop=True))
+
+
+def file_hash(*paths):
+    """sha1 of the files' contents"""
+    sha = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(2**20), b''):
+                sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_watermark(path=watermark_file):
+    """returns the watermark saved by the last run, None if there isn't one"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_watermark(hours_entries, input_hash, path=watermark_file):
+    """record the inputs and last hours date (to today) of this run"""
+    filt = hours_entries['Hours Date'] <= dt.today()
+    watermark = {
+        'input_hash': input_hash,
+        'last_hours_date': hours_entries.loc[filt, 'Hours Date'].max().isoformat(),
+        'hours_sheet': current_hours_wks,
+        'table_sheet': current_table_wks,
+    }
+    with open(path, 'w') as f:
+        json.dump(watermark, f, indent=4)
+
+
+def touched_since(hours_entries, watermark):
+    """Returns the first day of the earliest month that may have changed
+    since the watermark: the month of its last hours date (which was only
+    partly entered), or an earlier month that was an employee's last month
+    worked (its to-date columns are predictions) if they've since entered
+    hours. Edits to entries before that aren't picked up, run a full update
+    after corrections to older months.
+    """
+    last = pd.Timestamp(watermark['last_hours_date'])
+    start = last.to_period('M').start_time
+    new = hours_entries['Hours Date'] > last
+    returning = hours_entries['User Name'].isin(
+        hours_entries.loc[new, 'User Name'])
+    previous = hours_entries.loc[returning & ~new, 'Hours Date']
+    if not previous.empty:
+        previous_last = previous.groupby(hours_entries['User Name']).max()
+        start = min(start, previous_last.min().to_period('M').start_time)
+    return start
+
 
 def update_logins(e_df):    
     # convert to dictionary
@@ -150,156 +499,109 @@ def update_logins(e_df):
     print('login information updated')
 
 
-def multiindex_pivot(df, columns=None, values=None):
-    """https://github.com/pandas-dev/pandas/issues/23955"""
-    names = list(df.index.names)
-    df = df.reset_index()
-    list_index = df[names].values
-    tuples_index = [tuple(i) for i in list_index] # hashable
-    df = df.assign(tuples_index=tuples_index)
-    df = df.pivot(index="tuples_index", columns=columns, values=values)
-    tuples_index = df.index  # reduced
-    index = pd.MultiIndex.from_tuples(tuples_index, names=names)
-    df.index = index
-    return df
+def month_business_hours(start, month=None):
+    """8 hours per weekday from start (datetime64) to the end of month
+    (start's month by default)"""
+    start = np.asarray(start, dtype='datetime64[D]')
+    month = start if month is None else np.asarray(month)
+    month_end = month.astype('datetime64[M]') + 1
+    return 8 * np.busday_count(start, month_end.astype('datetime64[D]'))
 
 
-def get_idv_hours_entries(hours_entries, name):
+def build_timetables(hours_entries):
+    """Build every employee's timetable in one pass. Same rows, columns and
+    index as building them one employee at a time (in order of first entry)
+    and concatenating the results, see tests/test_compile_hours.py.
+    """
     # drop hours entered after today (common with vacation, time off)
-    filt = (
-                (hours_entries['User Name']==name) 
-                & (hours_entries['Hours Date'] <= dt.today())
-                )
-    idf = hours_entries.loc[filt, :]
-    
-    return idf
-
-
-def get_first_last(idf):
-    # get first day worked and last day worked
-    first_day_worked = idf['Hours Date'].min()
-    last_day_worked = idf['Hours Date'].max()
-    first_last = (first_day_worked, last_day_worked)
-
-    return first_last
-
-
-def pivot_idf(idf):
-    idf_sum = (
-        idf.groupby(['Entry Month', 'Entry Year', 'Classification'])['Entered Hours']
-        .sum()
-        .reset_index()
-        .set_index(['Entry Year', 'Entry Month'])
+    filt = hours_entries['Hours Date'] <= dt.today()
+    he = hours_entries.loc[filt, :]
+    names = pd.Index(hours_entries['User Name'].unique())
+    names = names[names.isin(he['User Name'])]
+
+    # sum hours by employee, month and classification
+    sums = (
+        he.groupby(['User Name', 'Entry Year', 'Entry Month', 'Classification'])
+        ['Entered Hours'].sum()
     )
-    
-    # pivot table
-    idf_pivot = multiindex_pivot(idf_sum,
-                                 columns='Classification', 
-                                 values='Entered Hours')
-
-    # fill na as 0
-    idf_pivot.fillna(0, inplace=True)
-
-    # calculate total hours
-    idf_pivot['Total'] = idf_pivot.sum(axis=1, skipna=True)
-
-    # sort by month
-    idf_pivot.reset_index(inplace=True)
-    idf_pivot['DT'] = pd.to_datetime(idf_pivot['Entry Year'].astype(str)
-                            + idf_pivot['Entry Month'], 
-                            format='%Y%b')
-    idf_pivot.sort_values(by=['DT'], inplace=True)
-
-    # add strategic year helper column
-    def strategy_year(row):
-        if row['DT'].month < pd.to_datetime('Apr', format='%b').month:
-            return str(row['DT'].year - 1) + "-" + str(row['DT'].year)
-        else:
-            return str(row['DT'].year) + "-" + str(row['DT'].year + 1)
-
-
-    idf_pivot['Strategy Year'] = idf_pivot.apply(strategy_year, axis=1)
-
-    # add semester helper column
-    def semester(row):
-        if (row['DT'].month < pd.to_datetime('Nov', format='%b').month and
-        row['DT'].month > pd.to_datetime('Mar', format='%b').month):
-            return 'Sem 1'
-        else: 
-            return 'Sem 2'
-
-
-    idf_pivot['Semester'] = 'None'
-
-    for strategy_year in idf_pivot['Strategy Year'].unique():
-        filt = idf_pivot['Strategy Year'] == strategy_year
-        idf_pivot.loc[filt, 'Semester'] = idf_pivot.loc[filt, :].apply(semester, axis=1)
-
-    # set index
-    idf_pivot.set_index(['Entry Year', 'Entry Month'], inplace=True)
-
-    return idf_pivot
-
-
-def add_meh(idf_pivot, first_last):
-    idf_pivot['MEH'] = idf_pivot['DT'].apply(
-        lambda x: 8 * len(pd.bdate_range(x, x + pd.offsets.MonthEnd(0)))
-    )
-
-    # correct for employees who start in middle of the period
-    first_month_worked = first_last[0].strftime('%b')
-    first_year_worked = first_last[0].strftime('%Y')
-
-    first_month_MEH = 8 * len(pd.bdate_range(first_last[0], first_last[0] + pd.offsets.MonthEnd(0)))
-
-    idf_pivot.at[(first_year_worked, first_month_worked), 'MEH'] = first_month_MEH
-    
-    return idf_pivot
-
-
-def calc_utilization(idf_pivot, first_last):
-    # Calculate meh_hours_to_date
-    fte_remaining = 8 * len(pd.bdate_range(
-        first_last[1] + pd.offsets.Day(1), first_last[1] + pd.offsets.MonthEnd(0)))
-    last_month_worked = first_last[1].strftime('%b')
-    last_year_worked = first_last[1].strftime('%Y')
-    meh_hours = idf_pivot.loc[(last_year_worked, last_month_worked), 'MEH']
-    meh_hours_to_date = meh_hours - fte_remaining
-    
-    # Calculate predicted billable hours for the current month
-    if 'Billable' in idf_pivot.columns:  
-        current_billable = idf_pivot.loc[(last_year_worked, last_month_worked), 
-                                'Billable']      
-        predicted_hours = (current_billable / meh_hours_to_date) * meh_hours
-    # for employees with no billable time, billable and predicted hours are 0
-    else:  
-        idf_pivot['Billable'] = predicted_hours = 0
-        
-
-    # Calculate actual utilization for all months
-    idf_pivot['Utilization'] = idf_pivot['Billable'] / idf_pivot['MEH']
-
-    # Calculate utilization to date for this month
-    idf_pivot['Util to Date'] = idf_pivot['Utilization']
-    util_to_date = predicted_hours/meh_hours
-    idf_pivot.at[(last_year_worked, last_month_worked), 'Util to Date'] = (
-        util_to_date
+    pivot = sums.unstack('Classification').fillna(0)
+    classes = list(pivot.columns)
+    total = pivot.sum(axis=1)
+
+    # classifications an employee never used are left out of their own
+    # timetable, so they're empty once concatenated
+    used_by_name = (sums.groupby(level=['User Name', 'Classification']).size()
+                    .unstack('Classification').notna())
+    used = used_by_name.reindex(pivot.index.get_level_values('User Name'))
+    pivot = pivot.where(used.to_numpy())
+    pivot['Total'] = total
+
+    # sort by employee (first entry first), then month
+    tt = pivot.reset_index()
+    tt['DT'] = pd.to_datetime(tt['Entry Year'].astype(str) + tt['Entry Month'],
+                              format='%Y%b')
+    order = pd.Series(np.arange(len(names)), index=names)
+    tt = tt.iloc[np.lexsort((tt['DT'].to_numpy(),
+                             order[tt['User Name']].to_numpy()))]
+
+    # add strategic year and semester helper columns
+    month = tt['DT'].dt.month
+    year = tt['DT'].dt.year
+    start_year = year - (month < 4)
+    tt['Strategy Year'] = (start_year.astype(str) + "-"
+                           + (start_year + 1).astype(str))
+    tt['Semester'] = np.where((month > 3) & (month < 11), 'Sem 1', 'Sem 2')
+
+    # add meh, corrected for employees who start in middle of the period
+    first_last = he.groupby('User Name')['Hours Date'].agg(['min', 'max'])
+    first_day = first_last.loc[tt['User Name'], 'min'].to_numpy()
+    last_day = first_last.loc[tt['User Name'], 'max'].to_numpy()
+    dt_month = tt['DT'].to_numpy().astype('datetime64[M]')
+    is_first = dt_month == first_day.astype('datetime64[M]')
+    is_last = dt_month == last_day.astype('datetime64[M]')
+    tt['MEH'] = month_business_hours(np.where(is_first, first_day,
+                                              tt['DT'].to_numpy()))
+
+    # for employees with no billable time, billable hours are 0
+    has_billable = tt['Billable'].notna() if 'Billable' in classes else False
+    if 'Billable' in classes:
+        tt['Billable'] = tt['Billable'].fillna(0)
+    else:
+        tt['Billable'] = 0
+
+    # Calculate actual utilization and FTE for all months
+    meh = tt['MEH'].to_numpy()
+    tt['Utilization'] = tt['Billable'] / tt['MEH']
+    tt['FTE'] = tt['Total'] / tt['MEH']
+
+    # Calculate utilization and FTE to date for the last month worked,
+    # predicted from the hours so far
+    fte_remaining = month_business_hours(last_day + np.timedelta64(1, 'D'),
+                                         last_day)
+    meh_hours_to_date = meh - fte_remaining
+    with np.errstate(divide='ignore', invalid='ignore'):
+        predicted_hours = (tt['Billable'].to_numpy() / meh_hours_to_date) * meh
+        predicted_total = (tt['Total'].to_numpy() / meh_hours_to_date) * meh
+    util_to_date = np.where(has_billable, predicted_hours / meh, 0.0)
+    tt['Util to Date'] = np.where(is_last, util_to_date, tt['Utilization'])
+    tt['FTE to Date'] = np.where(is_last, predicted_total / meh, tt['FTE'])
+
+    # columns in the order concatenating the employees' timetables gives
+    columns = []
+    for _, employee_used in used_by_name.loc[names].drop_duplicates().iterrows():
+        employee_classes = [cls for cls in classes if employee_used[cls]]
+        employee_columns = (
+            ['Entry Year', 'Entry Month'] + employee_classes
+            + ['Total', 'DT', 'Strategy Year', 'Semester', 'MEH']
+            + ([] if 'Billable' in employee_classes else ['Billable'])
+            + ['Utilization', 'Util to Date', 'FTE', 'FTE to Date', 'User Name']
         )
+        columns += [col for col in employee_columns if col not in columns]
 
-    # Calculate actual FTE for all months
-    idf_pivot['FTE'] = idf_pivot['Total'] / idf_pivot['MEH']
-
-    # Calculate FTE to date for this month
-    current_total = idf_pivot.loc[(last_year_worked, last_month_worked), 
-                            'Total']
-    predicted_total = (current_total / meh_hours_to_date) * meh_hours
-    idf_pivot['FTE to Date'] = idf_pivot['FTE']
-    fte_to_date = predicted_total / meh_hours
-    idf_pivot.at[(last_year_worked, last_month_worked), 'FTE to Date'] = (
-        fte_to_date
-        )
-    
-    return idf_pivot
+    # each employee's timetable is indexed from 0
+    tt.index = tt.groupby('User Name', sort=False).cumcount().to_numpy()
+
+    return tt[columns]
 
 
 ### EXECUTE ###
@@ -308,13 +610,22 @@ if __name__ == '__main__':
     start = dt.now()
 
     # load data
-    client = auth_gspread()
+    # google sheets, or the local directory in STORAGE_DIR
+    storage = get_storage(auth_gspread, save=save_to_gs, upsert=upsert_to_gs)
 
     # locate Cognos report from TESS
     tess_fn = get_latest_file(downloads, tess_file)
 
-    # read employees to dataframe
-    employeeWS_df = pd.read_excel(tess_fn, employees_sheet, engine='openpyxl')
+    # locate projects and budgets report
+    projects_fn = get_latest_file(downloads, funded_actuals_file)
+
+    # read employees, hours entries and projects to dataframes, the two
+    # workbooks are parsed in parallel
+    sheets = read_workbooks([
+        (tess_fn, [employees_sheet, hours_entries_sheet]),
+        (projects_fn, [projects_sheet]),
+    ])
+    employeeWS_df = sheets[employees_sheet]
 
     # filter out Employee IDs < 100000
     filt = employeeWS_df['Employee ID'] > 100000
@@ -330,7 +641,7 @@ if __name__ == '__main__':
     employeeWS_df['Organization'] = 'Environmental Incentives'
 
     # save employee ws to deltek-info
-    save_to_gs(employeeWS_df, client, deltek_info_sh, employee_work_sched_wks)
+    storage.write(employeeWS_df, deltek_info_sh, employee_work_sched_wks)
 
     # drop duplicate employee entries
     e_df = employeeWS_df[[
@@ -346,13 +657,10 @@ if __name__ == '__main__':
     # update login information (replace with individual login system)
     update_logins(e_df)
 
-    # Read hours entries
-    hours_entries = pd.read_excel(tess_fn, hours_entries_sheet, engine='openpyxl')
-
     # Read hours entries
     # Deltek adds rows for long comments and merges cells (why are they like this?)
-    # remove null rows (i.e., the added row)
-    hours_entries = hours_entries.dropna(how='all')
+    # the null rows (i.e., the added row) were skipped by stream_sheet
+    hours_entries = sheets[hours_entries_sheet]
 
     # create month and year convenience columns
     hours_entries['Entry Month'] = pd.DatetimeIndex(hours_entries['Hours Date']).strftime('%b')
@@ -368,17 +676,14 @@ if __name__ == '__main__':
 
     # Code hours entries
     # read in codes 
-    codes_df = load_report(client, deltek_info_sh, codes_wks)
+    codes_df = storage.read(deltek_info_sh, codes_wks,
+                            columns=['User Defined Code 3', 'Code'])
 
     # convert to dictionary
     codes_df = codes_df.set_index('User Defined Code 3')
     codes_dict = codes_df['Code'].to_dict()
 
-    # locate Cognos report from TESS
-    projects_fn = get_latest_file(downloads, funded_actuals_file)
-
-    # read employees to dataframe
-    projects_df = pd.read_excel(projects_fn, projects_sheet, engine='openpyxl')
+    projects_df = sheets[projects_sheet]
     
     # replace User defined codes with Codes
     account_group_df = projects_df[['Project ID', 'Account Group']].set_index('Project ID')
@@ -409,7 +714,7 @@ if __name__ == '__main__':
     projects_df['Project'] = projects_df['Project ID'].str[:4].replace(project_dict)
     
     # Save projects to Google Sheets
-    save_to_gs(projects_df, client, deltek_info_sh, projects_wks)
+    storage.write(projects_df, deltek_info_sh, projects_wks)
     
     # Join projects to hours_entries
     hours_entries['Project'] = hours_entries['Task ID'].str[:4].replace(project_dict)
@@ -430,41 +735,56 @@ if __name__ == '__main__':
     # categorize null Classifications (when an old timecode is removed from the system)
     hours_entries['Classification'] = hours_entries['Classification'].fillna('None')
 
-    # save hours entries to google sheets
-    save_to_gs(hours_entries, client, hours_entries_sh, current_hours_wks)
-
-    timetable_list = []
-
-    for name in hours_entries['User Name'].unique():
-        print(f'Processing {name}')
-        # Build timetable for each employee
-        idf = get_idv_hours_entries(hours_entries, name)
-        
-        if not idf.empty:
-        
-            # get first and last day worked
-            first_last = get_first_last(idf)
-            
-            # pivot individual hours
-            idf_pivot = pivot_idf(idf)
-
-            # add meh
-            idf_pivot = add_meh(idf_pivot, first_last)
-            
-            # calc utilization
-            idf_pivot = calc_utilization(idf_pivot, first_last)
-            
-            # associate name with record
-            idf_pivot['User Name'] = name
-            idf_pivot = idf_pivot.reset_index()
-            
-            timetable_list.append(idf_pivot)
-        
-    # concat all timetables
-    timetables = pd.concat(timetable_list)
-
-    # upload timetables to google sheets
-    save_to_gs(timetables, client, hours_entries_sh, current_table_wks)
+    # with --incremental only replace the months changed since the last
+    # run, if it wrote to the same sheets
+    input_hash = file_hash(tess_fn, projects_fn)
+    watermark = load_watermark()
+    incremental = ('--incremental' in sys.argv and watermark is not None
+                   and watermark['hours_sheet'] == current_hours_wks
+                   and watermark['table_sheet'] == current_table_wks)
+
+    if not incremental:
+        # save hours entries to google sheets
+        storage.write(hours_entries, hours_entries_sh, current_hours_wks)
+
+        # build timetables for all employees at once
+        timetables = build_timetables(hours_entries)
+
+        # upload timetables to google sheets
+        storage.write(timetables, hours_entries_sh, current_table_wks)
+
+        # save the names and projects offered by the app's dropdowns
+        storage.write(get_labels(hours_entries), hours_entries_sh,
+                      current_labels_wks)
+
+    elif watermark['input_hash'] == input_hash:
+        print('hours entries unchanged since the last run')
+
+    else:
+        since = touched_since(hours_entries, watermark)
+        print(f'updating hours entries and timetables from {since:%Y-%m-%d}')
+
+        # upsert changed hours entries
+        touched = hours_entries['Hours Date'] >= since
+        if not storage.upsert(hours_entries.loc[touched], hours_entries_sh,
+                              current_hours_wks, 'Hours Date', since):
+            storage.write(hours_entries, hours_entries_sh, current_hours_wks)
+
+        # rebuild timetables of the employees with changed hours, their
+        # whole history is needed for the first month's MEH
+        users = hours_entries['User Name'].isin(
+            hours_entries.loc[touched, 'User Name'])
+        timetables = build_timetables(hours_entries.loc[users])
+        if not storage.upsert(timetables.loc[timetables['DT'] >= since],
+                              hours_entries_sh, current_table_wks, 'DT', since):
+            storage.write(build_timetables(hours_entries), hours_entries_sh,
+                          current_table_wks)
+
+        # save the names and projects offered by the app's dropdowns
+        storage.write(get_labels(hours_entries), hours_entries_sh,
+                      current_labels_wks)
+
+    save_watermark(hours_entries, input_hash)
 
 
     ### CHECKS ###
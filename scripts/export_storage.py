@@ -0,0 +1,35 @@
+"""copy the worksheets the app and compile_hours read from google sheets to
+a local storage directory, to run, benchmark and test them offline with
+STORAGE_DIR set to it
+
+run from the repo root: python -m scripts.export_storage DIR
+"""
+
+import sys
+import time
+
+from components.loading import years
+from components.storage import GoogleSheetsStorage, ParquetStorage
+from components.utils import auth_gspread
+
+sheets = (
+    [('hours-entries', f'{year}-{kind}') for year in years
+     for kind in ['table', 'hours', 'labels']]
+    + [('forecasts', 'forecasts')]
+    + [('deltek-info', sheet) for sheet in ['employee-ws', 'codes', 'projects']]
+)
+
+
+if __name__ == '__main__':
+    source = GoogleSheetsStorage(auth_gspread)
+    dest = ParquetStorage(sys.argv[1])
+    for spreadsheet, sheet_title in sheets:
+        start = time.perf_counter()
+        try:
+            df = source.read(spreadsheet, sheet_title)
+        except Exception as e:
+            # labels sheets only exist for years compile_hours has written
+            print(f'{spreadsheet}/{sheet_title} not copied: {e!r}')
+            continue
+        dest.write(df, spreadsheet, sheet_title)
+        print(f'    {len(df)} rows in {time.perf_counter() - start:.1f}s')
@@ -0,0 +1,248 @@
+"""the ETL's pure functions, on small hand-made hours entries"""
+
+from datetime import datetime as dt
+import numpy as np
+import pandas as pd
+
+from scripts.compile_hours import build_timetables, touched_since
+
+
+def entries(rows):
+    df = pd.DataFrame(rows, columns=['User Name', 'Hours Date'])
+    df['Hours Date'] = pd.to_datetime(df['Hours Date'])
+    return df
+
+
+def test_touched_since_last_month():
+    hours_entries = entries([
+        ('B', '2024-05-20'), ('B', '2024-06-14'), ('B', '2024-06-20'),
+        # hasn't entered hours since february, doesn't move the start
+        ('C', '2024-02-28'),
+    ])
+    watermark = {'last_hours_date': '2024-06-14T00:00:00'}
+    assert touched_since(hours_entries, watermark) == pd.Timestamp('2024-06-01')
+
+
+def test_touched_since_returning_employee():
+    # A's last month worked was march, predicted to date, until they came
+    # back in july after the watermark
+    hours_entries = entries([
+        ('A', '2024-01-15'), ('A', '2024-03-12'), ('A', '2024-07-02'),
+        ('B', '2024-06-14'), ('B', '2024-06-20'),
+    ])
+    watermark = {'last_hours_date': '2024-06-14T00:00:00'}
+    assert touched_since(hours_entries, watermark) == pd.Timestamp('2024-03-01')
+
+
+def test_touched_since_nothing_new():
+    hours_entries = entries([('B', '2024-06-03'), ('B', '2024-06-14')])
+    watermark = {'last_hours_date': '2024-06-14T00:00:00'}
+    assert touched_since(hours_entries, watermark) == pd.Timestamp('2024-06-01')
+
+
+### per-employee timetables, the reference for build_timetables ###
+
+def multiindex_pivot(df, columns=None, values=None):
+    """https://github.com/pandas-dev/pandas/issues/23955"""
+    names = list(df.index.names)
+    df = df.reset_index()
+    list_index = df[names].values
+    tuples_index = [tuple(i) for i in list_index] # hashable
+    df = df.assign(tuples_index=tuples_index)
+    df = df.pivot(index="tuples_index", columns=columns, values=values)
+    tuples_index = df.index  # reduced
+    index = pd.MultiIndex.from_tuples(tuples_index, names=names)
+    df.index = index
+    return df
+
+
+def get_idv_hours_entries(hours_entries, name):
+    # drop hours entered after today (common with vacation, time off)
+    filt = (
+                (hours_entries['User Name']==name) 
+                & (hours_entries['Hours Date'] <= dt.today())
+                )
+    idf = hours_entries.loc[filt, :]
+    
+    return idf
+
+
+def get_first_last(idf):
+    # get first day worked and last day worked
+    first_day_worked = idf['Hours Date'].min()
+    last_day_worked = idf['Hours Date'].max()
+    first_last = (first_day_worked, last_day_worked)
+
+    return first_last
+
+
+def pivot_idf(idf):
+    idf_sum = (
+        idf.groupby(['Entry Month', 'Entry Year', 'Classification'])['Entered Hours']
+        .sum()
+        .reset_index()
+        .set_index(['Entry Year', 'Entry Month'])
+    )
+    
+    # pivot table
+    idf_pivot = multiindex_pivot(idf_sum,
+                                 columns='Classification', 
+                                 values='Entered Hours')
+
+    # fill na as 0
+    idf_pivot.fillna(0, inplace=True)
+
+    # calculate total hours
+    idf_pivot['Total'] = idf_pivot.sum(axis=1, skipna=True)
+
+    # sort by month
+    idf_pivot.reset_index(inplace=True)
+    idf_pivot['DT'] = pd.to_datetime(idf_pivot['Entry Year'].astype(str)
+                            + idf_pivot['Entry Month'], 
+                            format='%Y%b')
+    idf_pivot.sort_values(by=['DT'], inplace=True)
+
+    # add strategic year helper column
+    def strategy_year(row):
+        if row['DT'].month < pd.to_datetime('Apr', format='%b').month:
+            return str(row['DT'].year - 1) + "-" + str(row['DT'].year)
+        else:
+            return str(row['DT'].year) + "-" + str(row['DT'].year + 1)
+
+
+    idf_pivot['Strategy Year'] = idf_pivot.apply(strategy_year, axis=1)
+
+    # add semester helper column
+    def semester(row):
+        if (row['DT'].month < pd.to_datetime('Nov', format='%b').month and
+        row['DT'].month > pd.to_datetime('Mar', format='%b').month):
+            return 'Sem 1'
+        else: 
+            return 'Sem 2'
+
+
+    idf_pivot['Semester'] = 'None'
+
+    for strategy_year in idf_pivot['Strategy Year'].unique():
+        filt = idf_pivot['Strategy Year'] == strategy_year
+        idf_pivot.loc[filt, 'Semester'] = idf_pivot.loc[filt, :].apply(semester, axis=1)
+
+    # set index
+    idf_pivot.set_index(['Entry Year', 'Entry Month'], inplace=True)
+
+    return idf_pivot
+
+
+def add_meh(idf_pivot, first_last):
+    idf_pivot['MEH'] = idf_pivot['DT'].apply(
+        lambda x: 8 * len(pd.bdate_range(x, x + pd.offsets.MonthEnd(0)))
+    )
+
+    # correct for employees who start in middle of the period
+    first_month_worked = first_last[0].strftime('%b')
+    first_year_worked = first_last[0].strftime('%Y')
+
+    first_month_MEH = 8 * len(pd.bdate_range(first_last[0], first_last[0] + pd.offsets.MonthEnd(0)))
+
+    idf_pivot.at[(first_year_worked, first_month_worked), 'MEH'] = first_month_MEH
+    
+    return idf_pivot
+
+
+def calc_utilization(idf_pivot, first_last):
+    # Calculate meh_hours_to_date
+    fte_remaining = 8 * len(pd.bdate_range(
+        first_last[1] + pd.offsets.Day(1), first_last[1] + pd.offsets.MonthEnd(0)))
+    last_month_worked = first_last[1].strftime('%b')
+    last_year_worked = first_last[1].strftime('%Y')
+    meh_hours = idf_pivot.loc[(last_year_worked, last_month_worked), 'MEH']
+    meh_hours_to_date = meh_hours - fte_remaining
+    
+    # Calculate predicted billable hours for the current month
+    if 'Billable' in idf_pivot.columns:  
+        current_billable = idf_pivot.loc[(last_year_worked, last_month_worked), 
+                                'Billable']      
+        predicted_hours = (current_billable / meh_hours_to_date) * meh_hours
+    # for employees with no billable time, billable and predicted hours are 0
+    else:  
+        idf_pivot['Billable'] = predicted_hours = 0
+        
+
+    # Calculate actual utilization for all months
+    idf_pivot['Utilization'] = idf_pivot['Billable'] / idf_pivot['MEH']
+
+    # Calculate utilization to date for this month
+    idf_pivot['Util to Date'] = idf_pivot['Utilization']
+    util_to_date = predicted_hours/meh_hours
+    idf_pivot.at[(last_year_worked, last_month_worked), 'Util to Date'] = (
+        util_to_date
+        )
+
+    # Calculate actual FTE for all months
+    idf_pivot['FTE'] = idf_pivot['Total'] / idf_pivot['MEH']
+
+    # Calculate FTE to date for this month
+    current_total = idf_pivot.loc[(last_year_worked, last_month_worked), 
+                            'Total']
+    predicted_total = (current_total / meh_hours_to_date) * meh_hours
+    idf_pivot['FTE to Date'] = idf_pivot['FTE']
+    fte_to_date = predicted_total / meh_hours
+    idf_pivot.at[(last_year_worked, last_month_worked), 'FTE to Date'] = (
+        fte_to_date
+        )
+    
+    return idf_pivot
+
+
+def per_employee_timetables(hours_entries):
+    """the timetables compile_hours built one employee at a time"""
+    timetable_list = []
+    for name in hours_entries['User Name'].unique():
+        idf = get_idv_hours_entries(hours_entries, name)
+        if not idf.empty:
+            first_last = get_first_last(idf)
+            idf_pivot = pivot_idf(idf)
+            idf_pivot = add_meh(idf_pivot, first_last)
+            idf_pivot = calc_utilization(idf_pivot, first_last)
+            idf_pivot['User Name'] = name
+            idf_pivot = idf_pivot.reset_index()
+            timetable_list.append(idf_pivot)
+    return pd.concat(timetable_list)
+
+
+def hours_entries_sample(seed=0):
+    """two years of weekday entries for a few employees: one starting mid
+    month without R&D time, one without billable time, one whose last day
+    is a month end, and one with only future entries, in shuffled order"""
+    rng = np.random.default_rng(seed)
+    classes = ['Billable', 'Overhead', 'R&D', 'G&A', 'Time Off']
+    frames = []
+    for name, first, last, allowed in [
+        ('Alpha, Ann', '2023-06-14', '2024-10-09', ['Billable', 'Overhead',
+                                                    'G&A', 'Time Off']),
+        ('Beta, Bo', '2023-01-02', '2024-10-09', ['Overhead', 'R&D']),
+        ('Gamma, Cy', '2023-01-02', '2024-05-31', classes),
+        ('Delta, Di', '2023-03-01', '2024-09-30', classes),
+    ]:
+        days = pd.bdate_range(first, last).repeat(2)
+        frames.append(pd.DataFrame({
+            'User Name': name,
+            'Hours Date': days,
+            'Classification': rng.choice(allowed, len(days)),
+            'Entered Hours': rng.choice([0.5, 1.1, 2, 3.3, 4], len(days)),
+        }))
+    frames.append(pd.DataFrame({'User Name': 'Future, Only',
+                                'Hours Date': pd.Timestamp('2099-01-05'),
+                                'Classification': 'Billable',
+                                'Entered Hours': [8.0]}))
+    hours_entries = pd.concat(frames, ignore_index=True)
+    hours_entries['Entry Month'] = hours_entries['Hours Date'].dt.strftime('%b')
+    hours_entries['Entry Year'] = hours_entries['Hours Date'].dt.strftime('%Y')
+    return hours_entries.sample(frac=1, random_state=seed)
+
+
+def test_build_timetables_matches_per_employee():
+    hours_entries = hours_entries_sample()
+    pd.testing.assert_frame_equal(build_timetables(hours_entries),
+                                  per_employee_timetables(hours_entries),
+                                  check_exact=True)
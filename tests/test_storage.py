@@ -0,0 +1,45 @@
+"""the local parquet storage backend"""
+
+import pandas as pd
+
+from components.storage import ParquetStorage
+
+
+def hours(dates, hours):
+    return pd.DataFrame({'User Name': ['A', 'B'] * (len(dates) // 2),
+                         'Hours Date': pd.to_datetime(dates),
+                         'Entered Hours': hours})
+
+
+def test_upsert_matches_full_rewrite(tmp_path):
+    old = hours(['2024-04-01', '2024-04-02', '2024-05-01', '2024-05-02'],
+                [8.0, 8.0, 4.0, 4.0])
+    # may was edited and june entered since the last write
+    new = hours(['2024-04-01', '2024-04-02', '2024-05-01', '2024-05-02',
+                 '2024-06-03', '2024-06-04'],
+                [8.0, 8.0, 6.0, 2.0, 8.0, 7.5])
+    start = pd.Timestamp('2024-05-01')
+
+    upserted = ParquetStorage(str(tmp_path / 'upserted'))
+    upserted.write(old, 'hours-entries', '2024-hours')
+    assert upserted.upsert(new.loc[new['Hours Date'] >= start],
+                           'hours-entries', '2024-hours', 'Hours Date', start)
+
+    rewritten = ParquetStorage(str(tmp_path / 'rewritten'))
+    rewritten.write(new, 'hours-entries', '2024-hours')
+
+    pd.testing.assert_frame_equal(
+        upserted.read('hours-entries', '2024-hours'),
+        rewritten.read('hours-entries', '2024-hours'))
+
+
+def test_upsert_needs_existing_columns(tmp_path):
+    storage = ParquetStorage(str(tmp_path))
+    df = hours(['2024-05-01', '2024-05-02'], [8.0, 8.0])
+    start = pd.Timestamp('2024-05-01')
+    # nothing to upsert into
+    assert not storage.upsert(df, 'hours-entries', '2024-hours',
+                              'Hours Date', start)
+    storage.write(df, 'hours-entries', '2024-hours')
+    assert not storage.upsert(df.assign(Comments=''), 'hours-entries',
+                              '2024-hours', 'Hours Date', start)
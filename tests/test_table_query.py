@@ -0,0 +1,55 @@
+"""filter_query strings as DataTable sends them"""
+
+import pandas as pd
+
+from components.table_query import filter_mask, query_table
+
+
+def entries():
+    return pd.DataFrame({
+        'Project': pd.Categorical(['Alpha', 'Beta', 'alpha two']),
+        'Task Name': ['Design', 'Review', 'design review'],
+        'Entered Hours': [1.0, 4.0, 8.0],
+        'Hours Date': pd.to_datetime(['2024-01-02', '2024-02-03',
+                                      '2024-03-04']),
+    })
+
+
+def matches(filter_query):
+    return filter_mask(entries(), filter_query).tolist()
+
+
+def test_case_sensitive_text():
+    assert matches('{Project} scontains Alpha') == [True, False, False]
+    assert matches('{Task Name} scontains design') == [False, False, True]
+    assert matches('{Project} s= Beta') == [False, True, False]
+    assert matches('{Task Name} s!= Review') == [True, False, True]
+
+
+def test_case_insensitive_text():
+    assert matches('{Project} icontains alpha') == [True, False, True]
+    assert matches('{Task Name} icontains DESIGN') == [True, False, True]
+    assert matches('{Project} i= beta') == [False, True, False]
+    assert matches('{Task Name} i!= REVIEW') == [True, False, True]
+    assert matches('{Task Name} i< e') == [True, False, True]
+
+
+def test_numbers_and_dates():
+    assert matches('{Entered Hours} s> 2') == [False, True, True]
+    assert matches('{Entered Hours} i<= 4') == [True, True, False]
+    assert matches('{Entered Hours} s= 8') == [False, False, True]
+    assert matches('{Hours Date} datestartswith 2024-02') == [False, True,
+                                                              False]
+
+
+def test_quoted_values_and_combined_parts():
+    assert matches('{Project} scontains "alpha two"') == [False, False, True]
+    assert matches('{Project} icontains alpha && {Entered Hours} s> 2') == [
+        False, False, True]
+
+
+def test_query_table_filters_rows():
+    page, page_count, page_current = query_table(
+        entries(), '{Project} icontains ALPHA', [], 0)
+    assert page['Entered Hours'].tolist() == [1.0, 8.0]
+    assert (page_count, page_current) == (1, 0)